@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
 
+import io
 import os
 import sys
+import json
+import time
+import atexit
+import signal
+import socket
 import argparse
+import contextlib
 import readline
 
 import lexer      as l
@@ -10,8 +17,20 @@ import parser     as p
 import evaluator  as e
 import context    as c
 import obj        as o
+import output     as out
+import vectorize  as vec
 
 def main():
+    if sys.argv[1:2] == ["batch"]:
+        atexit.register(flush_output)
+        sys.exit(batch(sys.argv[2:]))
+
+    if sys.argv[1:2] == ["serve"]:
+        sys.exit(serve(sys.argv[2:]))
+
+    if sys.argv[1:2] == ["client"]:
+        sys.exit(client(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(description="The interpreter for Pluto")
 
     parser.add_argument("-f", "--file", action="store", dest="file", type=str, help="the file to execute")
@@ -19,11 +38,26 @@ def main():
     parser.add_argument("-t", "--tree", action="store_true", default=False, help="print the parse tree")
     parser.add_argument("-i", "--interactive", action="store_true", default=False, help="enter interactive mode after the file has been run")
     parser.add_argument("-n", "--no-prelude", action="store_true", dest="no_prelude", help="don't load the prelude")
+    parser.add_argument("-e", "--expr", action="store", dest="expr", type=str, help="the code to execute, instead of a file")
+    parser.add_argument("--each-line", action="store_true", dest="each_line", help="run the program once for each line of the input files, or stdin, with the line in `line`")
+    parser.add_argument("--begin", action="store", dest="begin", type=str, help="with --each-line, code to run before the first line")
+    parser.add_argument("--end", action="store", dest="end", type=str, help="with --each-line, code to run after the last line")
+    parser.add_argument("-u", "--unbuffered", action="store_true", default=False, help="write output straight away, instead of buffering it")
+    parser.add_argument("--explain-vectorize", action="store_true", dest="explain_vectorize", help="report which blocks passed to map, filter and fold are vectorized")
     parser.add_argument("-v", "--version", action="version", version="Pluto, early beta version")
+    parser.add_argument("inputs", nargs="*", help="with --each-line, the files to read lines from")
 
     args = parser.parse_args()
 
-    if args.file == None:
+    if len(args.inputs) > 0 and not args.each_line:
+        parser.error("unrecognized arguments: %s (use -f to run a file)" % " ".join(args.inputs))
+
+    vec.explain = args.explain_vectorize
+    out.unbuffered = out.unbuffered or args.unbuffered
+
+    atexit.register(flush_output)
+
+    if args.file == None and args.expr == None:
         ctx = c.Context()
         
         if not args.no_prelude:
@@ -32,7 +66,7 @@ def main():
         repl(ctx)
     else:
         try:
-            text = open(args.file).read()
+            text = args.expr if args.expr != None else open(args.file).read()
 
             if args.parse or args.tree:
                 tokens = l.lex(text)
@@ -51,29 +85,391 @@ def main():
             if not args.no_prelude:
                 import_prelude(ctx)
             
+            if args.each_line:
+                sys.exit(each_line(text, args.begin, args.end, args.inputs, ctx))
+
             execute(text, False, ctx)
 
             if args.interactive:
-                print()
+                out.write("\n")
                 repl(ctx)
 
-        except FileNotFoundError:
-            print("File not found: %s" % args.file)
-            return
+        except FileNotFoundError as err:
+            print("File not found: %s" % err.filename)
+            sys.exit(1)
 
 
-def execute(text, print_result, ctx):
+def flush_output():
+    try:
+        out.flush()
+    except BrokenPipeError:
+        pass
+
+def parse(text):
+    """parses text, returning the program, or None if there were errors"""
     tokens = l.lex(text)
     parser = p.Parser(tokens)
     program = parser.parse_program()
 
     if len(parser.errors) > 0:
         parser.print_errors()
+        return None
+
+    return program
+
+def execute(text, print_result, ctx):
+    """runs text, returning the result, or None if it didn't parse"""
+    program = parse(text)
+
+    if program == None:
+        return None
+
+    result = e.evaluate(program, ctx)
+
+    if (print_result and type(result) != o.Null) or e.is_err(result):
+        out.write_obj(result)
+        out.write("\n")
+
+    return result
+
+def each_line(text, begin, end, inputs, ctx):
+    """
+        runs the program in text for each line of the input files,
+        or stdin, returning the exit status. the program is parsed
+        once, and every line is run in the same frame, where `line`
+        is the line and `line_number` its number, counting from 1.
+        begin and end, if given, are run in that frame first and last
+    """
+    program = parse(text)
+
+    if program == None:
+        return 1
+
+    frame = ctx.enclose()
+
+    if begin != None:
+        result = execute(begin, False, frame)
+
+        if result == None or e.is_err(result):
+            return 1
+
+    for number, line in enumerate(input_lines(inputs), 1):
+        frame.store["line"] = o.String(line)
+        frame.store["line_number"] = o.number(number)
+
+        result = e.evaluate(program, frame)
+
+        if e.is_err(result):
+            out.write_obj(result)
+            out.write("\n")
+            return 1
+
+    if end != None:
+        result = execute(end, False, frame)
+
+        if result == None or e.is_err(result):
+            return 1
+
+    return 0
+
+def input_lines(paths):
+    if len(paths) == 0:
+        yield from o.lines(sys.stdin.buffer)
+        return
+
+    for path in paths:
+        if path == "-":
+            yield from o.lines(sys.stdin.buffer)
+            continue
+
+        with open(path, "rb", buffering=o.FILE_BUFFER) as f:
+            yield from o.lines(f)
+
+def batch(argv):
+    """
+        runs many scripts in one process, loading the prelude only
+        once. each script runs in its own copy of the prelude's
+        context, and its output is captured separately. returns 1
+        if any of the scripts failed
+    """
+    parser = argparse.ArgumentParser(prog="pluto batch", description="Runs many Pluto scripts in one process")
+
+    parser.add_argument("scripts", nargs="*", help="the scripts to run")
+    parser.add_argument("-m", "--manifest", action="store", dest="manifest", type=str, help="a file listing scripts to run, one per line")
+    parser.add_argument("-o", "--output-dir", action="store", dest="output_dir", type=str, help="write each script's output to files in this directory, instead of to stdout")
+    parser.add_argument("-r", "--report", action="store", dest="report", type=str, help="write the status and time of each script to this file, instead of to stderr")
+    parser.add_argument("-n", "--no-prelude", action="store_true", dest="no_prelude", help="don't load the prelude")
+
+    args = parser.parse_args(argv)
+    scripts = list(args.scripts)
+
+    if args.manifest != None:
+        try:
+            scripts += read_manifest(args.manifest)
+        except FileNotFoundError as err:
+            print("File not found: %s" % err.filename)
+            return 1
+
+    prelude = c.Context()
+
+    if not args.no_prelude:
+        import_prelude(prelude)
+
+    report = open(args.report, "w") if args.report != None else sys.stderr
+    failures = 0
+    start = time.perf_counter()
+
+    with report if args.report != None else contextlib.nullcontext():
+        for path in scripts:
+            status, stdout, stderr, elapsed = run_script(path, prelude)
+
+            if status != 0:
+                failures += 1
+
+            if args.output_dir != None:
+                name = os.path.join(args.output_dir, os.path.basename(path))
+
+                with open(name + ".out", "w") as f:
+                    f.write(stdout)
+
+                if len(stderr) > 0:
+                    with open(name + ".err", "w") as f:
+                        f.write(stderr)
+            else:
+                out.write("==> %s <==\n" % path)
+                out.write(stdout)
+                out.flush()
+                sys.stderr.write(stderr)
+
+            report.write("%s\t%s\t%.3fms\n" % (status, path, elapsed * 1000))
+
+    print("ran %s scripts in %.3fs, %s failed" % (len(scripts), time.perf_counter() - start, failures), file=sys.stderr)
+
+    return 1 if failures > 0 else 0
+
+def read_manifest(path):
+    """the scripts listed in a manifest, ignoring blank lines and # comments"""
+    base = os.path.dirname(path)
+    scripts = []
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+
+            if len(line) > 0 and not line.startswith("#"):
+                scripts.append(os.path.join(base, line))
+
+    return scripts
+
+def run_script(path, prelude):
+    """
+        runs the script at path in a copy of the prelude's context,
+        returning its exit status, output, error output and how
+        long it took
+    """
+    try:
+        with open(path) as f:
+            text = f.read()
+    except FileNotFoundError as err:
+        return 1, "", "File not found: %s\n" % err.filename, 0
+
+    status, stdout, stderr, elapsed, _ = run_source(text, prelude, {})
+    return status, stdout, stderr, elapsed
+
+def run_source(text, prelude, bindings):
+    """
+        runs text in a copy of the prelude's context, with extra
+        variables from bindings, capturing everything it writes.
+        returns its exit status, output, error output, how long
+        it took, and its result
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    start = time.perf_counter()
+    real_output = out.stdout
+    out.stdout = out.Output(stdout)
+
+    ctx = prelude.copy()
+    ctx.store.update(bindings)
+    result = None
+
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                result = execute(text, False, ctx)
+                status = 1 if result == None or e.is_err(result) else 0
+            except Exception as err:
+                # a crash in the interpreter shouldn't stop the other scripts
+                print("%s: %s" % (type(err).__name__, err), file=sys.stderr)
+                status = 2
+
+            out.flush()
+    finally:
+        out.stdout = real_output
+
+    return status, stdout.getvalue(), stderr.getvalue(), time.perf_counter() - start, result
+
+def serve(argv):
+    """
+        evaluates the prelude once, then forks workers which share
+        it and run scripts sent by `pluto client` over a unix socket.
+        each worker is replaced after it's handled a number of
+        requests, so that memory can't grow without bound
+    """
+    parser = argparse.ArgumentParser(prog="pluto serve", description="Serves Pluto scripts over a unix socket")
+
+    parser.add_argument("-s", "--socket", action="store", dest="socket", type=str, required=True, help="the path of the socket to listen on")
+    parser.add_argument("-w", "--workers", action="store", dest="workers", type=int, default=4, help="the number of worker processes")
+    parser.add_argument("-r", "--max-requests", action="store", dest="max_requests", type=int, default=1000, help="the number of requests a worker handles before it's replaced (0 for no limit)")
+    parser.add_argument("-t", "--timeout", action="store", dest="timeout", type=float, default=30, help="the number of seconds a worker waits for a client to send its request")
+    parser.add_argument("-n", "--no-prelude", action="store_true", dest="no_prelude", help="don't load the prelude")
+
+    args = parser.parse_args(argv)
+
+    prelude = c.Context()
+
+    if not args.no_prelude:
+        import_prelude(prelude)
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(args.socket)
+    listener.listen(128)
+
+    workers = set()
+
+    def spawn():
+        pid = os.fork()
+
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+            try:
+                work(listener, prelude, args.max_requests, args.timeout)
+            finally:
+                os._exit(0)
+
+        workers.add(pid)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        for _ in range(args.workers):
+            spawn()
+
+        while True:
+            pid, _ = os.wait()
+            workers.discard(pid)
+            spawn()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+        listener.close()
+        os.unlink(args.socket)
+
+    return 0
+
+def work(listener, prelude, max_requests, timeout):
+    handled = 0
+
+    while max_requests == 0 or handled < max_requests:
+        conn, _ = listener.accept()
+        handled += 1
+
+        with conn:
+            conn.settimeout(timeout)
+
+            try:
+                request = json.loads(receive_all(conn).decode("utf-8"))
+
+                if not isinstance(request, dict):
+                    raise ValueError("expected a json object")
+
+                if not isinstance(request.get("source"), str):
+                    raise ValueError("expected `source` to be a string")
+
+                if not isinstance(request.get("args", []), list):
+                    raise ValueError("expected `args` to be a list")
+
+                bindings = {"args": o.Array([o.String(str(arg)) for arg in request.get("args", [])])}
+                status, stdout, stderr, elapsed, result = run_source(request["source"], prelude, bindings)
+            except (ValueError, TypeError, OSError) as err:
+                status, stdout, stderr, elapsed, result = 1, "", "Invalid request: %s\n" % err, 0, None
+
+            response = {
+                "status": status,
+                "stdout": stdout,
+                "stderr": stderr,
+                "result": None if result == None or type(result) == o.Null else str(result),
+                "time": elapsed
+            }
+
+            try:
+                conn.sendall(json.dumps(response).encode("utf-8"))
+            except OSError:
+                pass
+
+def receive_all(conn):
+    chunks = []
+
+    while True:
+        chunk = conn.recv(1 << 16)
+
+        if len(chunk) == 0:
+            return b"".join(chunks)
+
+        chunks.append(chunk)
+
+def client(argv):
+    """sends a script to a `pluto serve` daemon and prints what it outputs, returning its exit status"""
+    parser = argparse.ArgumentParser(prog="pluto client", description="Runs a Pluto script on a server")
+
+    parser.add_argument("-s", "--socket", action="store", dest="socket", type=str, required=True, help="the path of the server's socket")
+    parser.add_argument("-f", "--file", action="store", dest="file", type=str, help="the file to execute")
+    parser.add_argument("-e", "--expr", action="store", dest="expr", type=str, help="the code to execute, instead of a file")
+    parser.add_argument("-p", "--print-result", action="store_true", dest="print_result", help="print the value the script evaluates to")
+    parser.add_argument("args", nargs="*", help="arguments for the script, in `args`")
+
+    args = parser.parse_args(argv)
+
+    if args.expr != None:
+        source = args.expr
+    elif args.file != None:
+        try:
+            with open(args.file) as f:
+                source = f.read()
+        except FileNotFoundError as err:
+            print("File not found: %s" % err.filename, file=sys.stderr)
+            return 1
     else:
-        result = e.evaluate(program, ctx)
+        source = sys.stdin.read()
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(args.socket)
+            conn.sendall(json.dumps({"source": source, "args": args.args}).encode("utf-8"))
+            conn.shutdown(socket.SHUT_WR)
+            response = json.loads(receive_all(conn).decode("utf-8"))
+    except (OSError, ValueError) as err:
+        print("Could not talk to the server at %s: %s" % (args.socket, err), file=sys.stderr)
+        return 1
+
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+
+    if args.print_result and response["result"] != None:
+        print(response["result"])
 
-        if (print_result and type(result) != o.Null) or e.is_err(result):
-            print(result)
+    return response["status"]
 
 def repl(ctx):
     print("Pluto REPL - https://pluto.zacgarby.co.uk")
@@ -81,6 +477,7 @@ def repl(ctx):
 
     while True:
         try:
+            out.flush()
             string = input(">> ")
 
             if string[:-1] == "exit":
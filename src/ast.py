@@ -75,6 +75,7 @@ class Number(Expression):
     def __init__(self, token, value):
         self.token = token
         self.value = value
+        self.boxed = None # the evaluated object, shared between evaluations
 
     def tree(self, indent, name):
         return "%s%s" % (_(indent) + n(name), self.value)
@@ -95,6 +96,7 @@ class String(Expression):
     def __init__(self, token):
         self.token = token
         self.value = token.literal
+        self.boxed = None # the evaluated object, shared between evaluations
 
     def tree(self, indent, name):
         return '%s"%s"' % (_(indent) + n(name), self.value)
@@ -478,6 +480,19 @@ class ReturnStatement(Statement):
         )
 
 
+class YieldStatement(Statement):
+    """a yield statement, which makes its function or block a generator"""
+    def __init__(self, token, value):
+        self.token = token
+        self.value = value
+
+    def tree(self, indent, name):
+        return "%syield\n%s" % (
+            _(indent) + n(name),
+            self.value.tree(indent + 1, "value")
+        )
+
+
 class NextStatement(Statement):
     """the next statement"""
     def __init__(self, token):
@@ -1,9 +1,21 @@
+import os
+import re
+import csv
+import json
 import math
+import codecs
+import mmap
+import array
+import bisect
 
 import obj
 import ast
 import context
-from evaluator import NULL, TRUE, FALSE, evaluate, err, is_truthy, is_err
+import linalg
+import output
+import regex_cache
+import vectorize
+from evaluator import NULL, TRUE, FALSE, divide, evaluate, err, is_truthy, is_err, eval_body, unwrap_return_value
 
 
 class Builtin(object):
@@ -53,7 +65,7 @@ def arg(name, expected_type):
 def round_n(args, context):
     n = args["n"]
     
-    return obj.Number(round(n.value))
+    return obj.number(round(n.value))
 
 @builtin
 @pattern("type of $instance")
@@ -63,21 +75,46 @@ def type_of_instance(args, context):
     
     return instance.base
 
+def _unprintable(o):
+    """
+        the error a heap gives if its values can't be ordered, or
+        None. a heap which can be ordered keeps its order, so it
+        isn't sorted again when it's written
+    """
+    if type(o) == obj.Heap:
+        elements = o.get_elements()
+
+        if len(elements) == 1 and is_err(elements[0]):
+            return elements[0]
+
+    return None
+
 @builtin
 @pattern("print $obj")
 def print_obj(args, context):
-    print(args["obj"])
+    invalid = _unprintable(args["obj"])
+    if invalid != None:
+        return invalid
+
+    output.write_obj(args["obj"])
+    output.write("\n")
     return NULL
 
 @builtin
 @pattern("print $obj without newline")
 def print_obj_without_newline(args, context):
-    print(args["obj"], end="")
+    invalid = _unprintable(args["obj"])
+    if invalid != None:
+        return invalid
+
+    output.write_obj(args["obj"])
     return NULL
 
 @builtin
 @pattern("input")
 def _input(args, context):
+    output.flush()
+
     try:
         return obj.String(input())
     except (KeyboardInterrupt, EOFError):
@@ -86,6 +123,8 @@ def _input(args, context):
 @builtin
 @pattern("prompt $prompt")
 def prompt_prompt(args, context):
+    output.flush()
+
     try:
         return obj.String(input(args["prompt"]))
     except (KeyboardInterrupt, EOFError):
@@ -95,7 +134,8 @@ def _run_block(block, args, context):
     params = [param.value for param in block.params]
     args_dict = dict(zip(params, args))
     ctx = context.enclose_with_args(args_dict)
-    return evaluate(block.body, ctx)
+
+    return eval_body(block.body, ctx)
 
 @builtin
 @pattern("do $block")
@@ -141,12 +181,19 @@ def do_block_on_arg(args, context):
 @arg("block", obj.Block)
 @arg("array", obj.Collection)
 def map_block_over_array(args, context):
-    array = args["array"].get_elements()
     block = args["block"]
 
+    vectorized = vectorize.try_map(block, args["array"], context)
+    if vectorized != None:
+        return vectorized
+
+    array = args["array"].iter()
     result = []
 
     for item in array:
+        if is_err(item):
+            return item
+
         mapped = _run_block(block, [item], context)
 
         if is_err(mapped):
@@ -154,22 +201,28 @@ def map_block_over_array(args, context):
 
         result.append(mapped)
 
-    return type(args["array"])(result)
+    return args["array"].rebuild(result)
 
 @builtin
 @pattern("left fold $array with $block")
 @arg("array", obj.Collection)
 @arg("block", obj.Block)
 def fold_array_with_block(args, context):
-    array = args["array"].get_elements()
     block = args["block"]
 
-    result = array[0]
+    vectorized = vectorize.try_fold(block, args["array"], None, context)
+    if vectorized != None:
+        return vectorized
 
-    if len(array) == 0:
+    array = args["array"].iter()
+    result = next(array, NULL)
+    if is_err(result):
         return result
 
-    for item in array[1:]:
+    for item in array:
+        if is_err(item):
+            return item
+
         mapped = _run_block(block, [result, item], context)
 
         if is_err(mapped):
@@ -184,15 +237,19 @@ def fold_array_with_block(args, context):
 @arg("array", obj.Collection)
 @arg("block", obj.Block)
 def fold_array_with_block(args, context):
-    array = args["array"].get_elements()
     block = args["block"]
 
-    result = args["start"]
+    vectorized = vectorize.try_fold(block, args["array"], args["start"], context)
+    if vectorized != None:
+        return vectorized
 
-    if len(array) == 0:
-        return result
+    array = args["array"].iter()
+    result = args["start"]
 
     for item in array:
+        if is_err(item):
+            return item
+
         mapped = _run_block(block, [result, item], context)
 
         if is_err(mapped):
@@ -207,14 +264,17 @@ def fold_array_with_block(args, context):
 @arg("array", obj.Collection)
 @arg("block", obj.Block)
 def fold_array_with_block(args, context):
-    array = args["array"].get_elements()
-    array.reverse()
-
+    array = args["array"].reverse_iter()
     block = args["block"]
 
-    result = array[0]
+    result = next(array, NULL)
+    if is_err(result):
+        return result
+
+    for item in array:
+        if is_err(item):
+            return item
 
-    for item in array[1:]:
         mapped = _run_block(block, [result, item], context)
 
         if is_err(mapped):
@@ -229,13 +289,15 @@ def fold_array_with_block(args, context):
 @arg("array", obj.Collection)
 @arg("block", obj.Block)
 def fold_array_with_block(args, context):
-    array = args["array"].get_elements()
-    array.reverse()
-
+    array = args["array"].reverse_iter()
     block = args["block"]
+
     result = args["start"]
 
     for item in array:
+        if is_err(item):
+            return item
+
         mapped = _run_block(block, [result, item], context)
 
         if is_err(mapped):
@@ -250,12 +312,20 @@ def fold_array_with_block(args, context):
 @arg("array", obj.Collection)
 @arg("predicate", obj.Block)
 def filter_array_with_predicate(args, context):
-    array = args["array"].get_elements()
     predicate = args["predicate"]
 
+    vectorized = vectorize.try_filter(predicate, args["array"], context)
+    if vectorized != None:
+        return vectorized
+
+    array = args["array"].iter()
+
     filtered = []
 
     for item in array:
+        if is_err(item):
+            return item
+
         result = _run_block(predicate, [item], context)
 
         if is_err(result):
@@ -264,7 +334,7 @@ def filter_array_with_predicate(args, context):
         if is_truthy(result):
             filtered.append(item)
 
-    return type(args["array"])(filtered)
+    return args["array"].rebuild(filtered)
 
 @builtin
 @pattern("union of $a and $b")
@@ -280,7 +350,7 @@ def union_of_a_and_b(args, context):
         if item not in result:
             result.append(item)
 
-    return type(args["a"])(result)
+    return args["a"].rebuild(result)
 
 @builtin
 @pattern("intersection of $a and $b")
@@ -292,7 +362,7 @@ def union_of_a_and_b(args, context):
 
     result = [elem for elem in a if elem in b]
 
-    return type(args["a"])(result)
+    return args["a"].rebuild(result)
 
 @builtin
 @pattern("index $i of $array")
@@ -302,98 +372,1771 @@ def index_i_of_array(args, context):
     i = args["i"]
     array = args["array"]
 
-    if not i.is_integer() or not i.is_positive() or not int(i.value) < len(array.get_elements()):
-        return err("invalid index: %s" % i, "OutOfBoundsError")
+    if not i.is_integer() or not i.is_positive() or not int(i.value) < array.length():
+        return err(context, "invalid index: %s" % i, "OutOfBoundsError")
 
-    return array.get_elements()[int(i.value)]
+    return array.at(int(i.value))
 
 @builtin
-@pattern("key $key of $obj")
-@arg("obj", obj.Map)
-def key_of_obj(args, context):
-    key = args["key"]
-    obj = args["obj"]
+@pattern("slice $collection from $start to $end")
+@arg("collection", obj.Collection)
+@arg("start", obj.Number)
+@arg("end", obj.Number)
+def slice_collection_from_start_to_end(args, context):
+    collection = args["collection"]
+    start = args["start"]
+    end = args["end"]
 
-    if key not in obj.pairs.keys():
-        return err("key %s not found" % key, "NotFoundError")
+    if not start.is_integer() or not start.is_positive():
+        return err(context, "invalid start index: %s" % start, "OutOfBoundsError")
 
-    return obj.pairs[key]
+    if not end.is_integer() or not end.is_positive():
+        return err(context, "invalid end index: %s" % end, "OutOfBoundsError")
+
+    return collection.slice(int(start.value), int(end.value))
 
 @builtin
-@pattern("keys of $obj")
-@arg("obj", obj.Map)
-def keys_of_obj(args, context):
-    return obj.Array(args["obj"].pairs.keys())
+@pattern("first $n of $collection")
+@arg("n", obj.Number)
+@arg("collection", obj.Collection)
+def first_n_of_collection(args, context):
+    n = args["n"]
+
+    if not n.is_integer() or not n.is_positive():
+        return err(context, "invalid count: %s" % n, "OutOfBoundsError")
+
+    return args["collection"].slice(0, int(n.value))
 
 @builtin
-@pattern("values of $obj")
-@arg("obj", obj.Map)
-def values_of_obj(args, context):
-    return obj.Array(args["obj"].pairs.values())
+@pattern("last $n of $collection")
+@arg("n", obj.Number)
+@arg("collection", obj.Collection)
+def last_n_of_collection(args, context):
+    n = args["n"]
+    collection = args["collection"]
+
+    if not n.is_integer() or not n.is_positive():
+        return err(context, "invalid count: %s" % n, "OutOfBoundsError")
+
+    length = collection.length()
+    return collection.slice(max(0, length - int(n.value)), length)
 
 @builtin
-@pattern("pairs of $obj")
-@arg("obj", obj.Map)
-def pairs_of_obj(args, context):
-    o = args["obj"]
-    pairs = []
+@pattern("rest of $collection")
+@arg("collection", obj.Collection)
+def rest_of_collection(args, context):
+    collection = args["collection"]
+    return collection.slice(1, collection.length())
 
-    for (key, value) in o.pairs.items():
-        pairs.append(obj.Tuple([key, value]))
+@builtin
+@pattern("$collection contains $item")
+@arg("collection", obj.Collection)
+def collection_contains_item(args, context):
+    return TRUE if args["collection"].contains(args["item"]) else FALSE
 
-    return obj.Array(pairs)
+@builtin
+@pattern("len $collection")
+@arg("collection", obj.Collection)
+def len_collection(args, context):
+    return obj.number(args["collection"].length())
+
+## Numeric arrays ##
+
+def _numbers(collection, context):
+    """returns the raw values in collection, or an error if they aren't all numbers"""
+    if type(collection) == obj.NumArray:
+        return collection.data
+
+    if type(collection) == obj.Range:
+        return collection.range
+
+    values = []
+
+    for item in collection.iter():
+        if is_err(item):
+            return item
+
+        if type(item) != obj.Number:
+            return err(context, "expected a collection of numbers, but found a %s" % item.type, "TypeError")
+
+        values.append(item.value)
+
+    return values
 
 @builtin
-@pattern("$start to $end")
-@arg("start", obj.Number)
-@arg("end", obj.Number)
-def start_to_end(args, context):
-    start = args["start"]
-    end = args["end"]
+@pattern("numeric $collection")
+@arg("collection", obj.Collection)
+def numeric_collection(args, context):
+    values = _numbers(args["collection"], context)
+    if is_err(values):
+        return values
 
-    if not start.is_integer():
-        return err("$start in `$start to $end` must be an integer", "TypeError")
+    try:
+        return obj.numeric(values)
+    except OverflowError:
+        return err(context, "the numbers are too large for a numeric array", "GeneralError")
 
-    if not end.is_integer():
-        return err("$end in `$start to $end` must be an integer", "TypeError")
+@builtin
+@pattern("sum of $collection")
+@arg("collection", obj.Collection)
+def sum_of_collection(args, context):
+    values = _numbers(args["collection"], context)
+    if is_err(values):
+        return values
 
-    s_val = int(start.value)
-    e_val = int(end.value)
+    return obj.number(sum(values))
 
-    if e_val < s_val:
-        result = obj.Array([obj.Number(e + 1) for e in range(e_val, s_val)])
-        result.elements.reverse()
-        return result
-    elif e_val > s_val:
-        return obj.Array([obj.Number(e) for e in range(s_val, e_val)])
+@builtin
+@pattern("min of $collection")
+@arg("collection", obj.Collection)
+def min_of_collection(args, context):
+    values = _numbers(args["collection"], context)
+    if is_err(values):
+        return values
+
+    if len(values) == 0:
+        return err(context, "cannot find the minimum of an empty collection", "GeneralError")
+
+    return obj.number(min(values))
+
+@builtin
+@pattern("max of $collection")
+@arg("collection", obj.Collection)
+def max_of_collection(args, context):
+    values = _numbers(args["collection"], context)
+    if is_err(values):
+        return values
+
+    if len(values) == 0:
+        return err(context, "cannot find the maximum of an empty collection", "GeneralError")
+
+    return obj.number(max(values))
+
+@builtin
+@pattern("mean of $collection")
+@arg("collection", obj.Collection)
+def mean_of_collection(args, context):
+    values = _numbers(args["collection"], context)
+    if is_err(values):
+        return values
+
+    if len(values) == 0:
+        return err(context, "cannot find the mean of an empty collection", "GeneralError")
+
+    return obj.number(divide(sum(values), len(values)))
+
+## Matrices ##
+
+def _check_matrix_index(i, size, context, name):
+    if not i.is_integer() or not i.is_positive() or not int(i.value) < size:
+        return err(context, "invalid %s index: %s" % (name, i), "OutOfBoundsError")
+
+    return None
+
+@builtin
+@pattern("matrix $rows")
+@arg("rows", obj.Collection)
+def matrix_rows(args, context):
+    values = []
+    cols = None
+    n = 0
+
+    for row in args["rows"].iter():
+        if is_err(row):
+            return row
+
+        if not isinstance(row, obj.Collection):
+            return err(context, "expected each row of a matrix to be a collection, but found a %s" % row.type, "TypeError")
+
+        row_values = _numbers(row, context)
+        if is_err(row_values):
+            return row_values
+
+        if cols == None:
+            cols = len(row_values)
+        elif len(row_values) != cols:
+            return err(context, "every row of a matrix must be the same length", "TypeError")
+
+        values.extend(row_values)
+        n += 1
+
+    return obj.matrix(n, cols or 0, values)
+
+@builtin
+@pattern("identity $n")
+@arg("n", obj.Number)
+def identity_n(args, context):
+    invalid = _count(args["n"], context, "the size of a matrix")
+    if invalid:
+        return invalid
+
+    n = int(args["n"].value)
+    return obj.matrix(n, n, [1.0 if i == j else 0.0 for i in range(n) for j in range(n)])
+
+@builtin
+@pattern("zeros $rows by $cols")
+@arg("rows", obj.Number)
+@arg("cols", obj.Number)
+def zeros_rows_by_cols(args, context):
+    invalid = _count(args["rows"], context, "the number of rows") or _count(args["cols"], context, "the number of columns")
+    if invalid:
+        return invalid
+
+    rows, cols = int(args["rows"].value), int(args["cols"].value)
+    return obj.matrix(rows, cols, bytes(8 * rows * cols))
+
+@builtin
+@pattern("size of $m")
+@arg("m", obj.Matrix)
+def size_of_m(args, context):
+    m = args["m"]
+    return obj.Tuple([obj.number(m.rows), obj.number(m.cols)])
+
+@builtin
+@pattern("transpose of $m")
+@arg("m", obj.Matrix)
+def transpose_of_m(args, context):
+    return args["m"].transpose()
+
+@builtin
+@pattern("row $i of $m")
+@arg("i", obj.Number)
+@arg("m", obj.Matrix)
+def row_i_of_m(args, context):
+    invalid = _check_matrix_index(args["i"], args["m"].rows, context, "row")
+    if invalid:
+        return invalid
+
+    return args["m"].row_view(int(args["i"].value))
+
+@builtin
+@pattern("column $j of $m")
+@arg("j", obj.Number)
+@arg("m", obj.Matrix)
+def column_j_of_m(args, context):
+    invalid = _check_matrix_index(args["j"], args["m"].cols, context, "column")
+    if invalid:
+        return invalid
+
+    return args["m"].column_view(int(args["j"].value))
+
+@builtin
+@pattern("entry $i $j of $m")
+@arg("i", obj.Number)
+@arg("j", obj.Number)
+@arg("m", obj.Matrix)
+def entry_i_j_of_m(args, context):
+    m = args["m"]
+
+    invalid = _check_matrix_index(args["i"], m.rows, context, "row") or _check_matrix_index(args["j"], m.cols, context, "column")
+    if invalid:
+        return invalid
+
+    return obj.number(m.get(int(args["i"].value), int(args["j"].value)))
+
+@builtin
+@pattern("entries of $m")
+@arg("m", obj.Matrix)
+def entries_of_m(args, context):
+    return obj.numeric(args["m"].values())
+
+@builtin
+@pattern("solve $a with $b")
+@arg("a", obj.Matrix)
+def solve_a_with_b(args, context):
+    a, b = args["a"], args["b"]
+
+    if a.rows != a.cols:
+        return err(context, "can only solve with a square matrix, not a %sx%s one" % (a.rows, a.cols), "TypeError")
+
+    if type(b) == obj.Matrix:
+        if b.rows != a.rows:
+            return err(context, "cannot solve a %sx%s matrix with a %sx%s matrix" % (a.rows, a.cols, b.rows, b.cols), "TypeError")
+
+        rhs = b.row_lists()
+    elif isinstance(b, obj.Collection):
+        values = _numbers(b, context)
+        if is_err(values):
+            return values
+
+        if len(values) != a.rows:
+            return err(context, "cannot solve a %sx%s matrix with a vector of length %s" % (a.rows, a.cols, len(values)), "TypeError")
+
+        rhs = [[v] for v in values]
+    else:
+        return err(context, "expected a matrix or a collection of numbers to solve with, but found a %s" % b.type, "TypeError")
+
+    try:
+        x = linalg.solve(a, rhs)
+    except linalg.SingularMatrix:
+        return err(context, "the matrix is singular", "GeneralError")
+
+    if type(b) == obj.Matrix:
+        return obj.matrix(b.rows, b.cols, [v for row in x for v in row])
+
+    return obj.numeric([row[0] for row in x])
+
+## Sorting ##
+#
+# Numbers, strings, chars and tuples are totally ordered: numbers
+# come first, then strings and chars (compared by their text), then
+# tuples, which are compared element by element. Instances can
+# define a `__compare $other` method, returning a negative number,
+# zero or a positive number.
+
+def _sort_key(o, context):
+    t = type(o)
+
+    if t == obj.Number:
+        return (0, o.value)
+
+    if t == obj.String or t == obj.Char:
+        return (1, o.value)
+
+    if t == obj.Tuple:
+        return (2, tuple(_sort_key(e, context) for e in o.iter()))
+
+    raise obj.SortError(err(context, "cannot sort a %s" % o.type, "TypeError"))
+
+def _compare_instance(instance, other, context):
+    method = instance.base.get_method("__compare $")
+
+    if not method:
+        raise obj.SortError(err(context, "cannot sort a %s, since it has no __compare $ method" % instance.base.name, "TypeError"))
+
+    param = next(item for item in method.fn.pattern if type(item) == ast.Parameter)
+    enclosed = context.enclose_with_args({param.name: other, "self": instance})
+    result = unwrap_return_value(evaluate(method.fn.body, enclosed))
+
+    if is_err(result):
+        raise obj.SortError(result)
+
+    if type(result) != obj.Number:
+        raise obj.SortError(err(context, "__compare $ must return a number, not a %s" % result.type, "TypeError"))
+
+    return result.value
+
+def _compare(a, b, context):
+    if isinstance(a, obj.Instance):
+        return _compare_instance(a, b, context)
+
+    if isinstance(b, obj.Instance):
+        return -_compare_instance(b, a, context)
+
+    a, b = _sort_key(a, context), _sort_key(b, context)
+    return (a > b) - (a < b)
+
+class _Ordered(object):
+    """wraps a value so that python compares it in pluto's ordering"""
+    __slots__ = ["value", "key", "context"]
+    __hash__ = None
+
+    def __init__(self, value, context):
+        self.value = value
+        self.context = context
+        self.key = None if isinstance(value, obj.Instance) else _sort_key(value, context)
+
+    def __lt__(self, other):
+        if self.key != None and other.key != None:
+            return self.key < other.key
+
+        return _compare(self.value, other.value, self.context) < 0
+
+    def __eq__(self, other):
+        if self.key != None and other.key != None:
+            return self.key == other.key
+
+        return _compare(self.value, other.value, self.context) == 0
+
+def _sort(collection, block, descending, context):
+    """
+        sorts collection, ordering its elements by the results
+        of block if it isn't None. returns the sorted collection
+        or an error
+    """
+    if block == None and type(collection) == obj.NumArray:
+        return obj.NumArray(array.array(collection.data.typecode, sorted(collection.data, reverse=descending)))
+
+    items = []
+
+    for item in collection.iter():
+        if is_err(item):
+            return item
+
+        items.append(item)
+
+    if block == None:
+        keys = items
+    else:
+        # the block is run once per element, rather than once per comparison
+        keys = []
+
+        for item in items:
+            k = _run_block(block, [item], context)
+            if is_err(k):
+                return k
+
+            keys.append(k)
+
+    if any(isinstance(k, obj.Instance) for k in keys):
+        key = lambda k: _Ordered(k, context)
     else:
-        return start
+        key = lambda k: _sort_key(k, context)
+
+    try:
+        order = sorted(range(len(items)), key=lambda i: key(keys[i]), reverse=descending)
+    except obj.SortError as e:
+        return e.error
+
+    return collection.rebuild([items[i] for i in order])
 
 @builtin
-@pattern("format $format with $args")
-@arg("format", obj.String)
-@arg("args", obj.Collection)
-def format_string_with_args(args, context):
-    fmt = args["format"].value
-    items = tuple(args["args"].get_elements())
+@pattern("sort $collection")
+@arg("collection", obj.Collection)
+def sort_collection(args, context):
+    return _sort(args["collection"], None, False, context)
+
+@builtin
+@pattern("sort $collection descending")
+@arg("collection", obj.Collection)
+def sort_collection_descending(args, context):
+    return _sort(args["collection"], None, True, context)
+
+@builtin
+@pattern("sort $collection by $block")
+@arg("collection", obj.Collection)
+@arg("block", obj.Block)
+def sort_collection_by_block(args, context):
+    return _sort(args["collection"], args["block"], False, context)
+
+@builtin
+@pattern("sort $collection by $block descending")
+@arg("collection", obj.Collection)
+@arg("block", obj.Block)
+def sort_collection_by_block_descending(args, context):
+    return _sort(args["collection"], args["block"], True, context)
+
+## Heaps and sorted lists ##
+
+def _ordered_items(collection, context):
+    """returns a list of (key, item) for each item in collection, or an error"""
+    result = []
+
+    for item in collection.iter():
+        if is_err(item):
+            return item
+
+        try:
+            result.append((_Ordered(item, context), item))
+        except obj.SortError as e:
+            return e.error
+
+    return result
+
+class _OrderedView(object):
+    """a read-only sequence of the keys of a collection, for bisect"""
+    def __init__(self, collection, context):
+        self.collection = collection
+        self.context = context
+
+    def __len__(self):
+        return self.collection.length()
+
+    def __getitem__(self, i):
+        return _Ordered(self.collection.at(i), self.context)
+
+@builtin
+@pattern("heap")
+def heap(args, context):
+    return obj.Heap()
+
+@builtin
+@pattern("heap of $collection")
+@arg("collection", obj.Collection)
+def heap_of_collection(args, context):
+    items = _ordered_items(args["collection"], context)
+    if is_err(items):
+        return items
 
     try:
-        return obj.String(fmt % items)
-    except TypeError:
-        return err("Wrong number of arguments to format `%s`" % fmt, "TypeError")
+        return obj.Heap([(key, n, item) for n, (key, item) in enumerate(items)])
+    except obj.SortError as e:
+        return e.error
 
 @builtin
-@pattern("printf $format with $args")
-@arg("format", obj.String)
-@arg("args", obj.Collection)
-def printf_format_with_args(args, context):
-    fmt = args["format"].value
-    items = tuple(args["args"].get_elements())
+@pattern("sorted list")
+def sorted_list(args, context):
+    return obj.SortedList()
+
+@builtin
+@pattern("sorted list of $collection")
+@arg("collection", obj.Collection)
+def sorted_list_of_collection(args, context):
+    items = _ordered_items(args["collection"], context)
+    if is_err(items):
+        return items
 
     try:
-        print(obj.String(fmt % items))
-    except TypeError:
-        return err("Wrong number of arguments to format `%s`" % fmt, "TypeError")
+        items.sort(key=lambda pair: pair[0])
+    except obj.SortError as e:
+        return e.error
 
-    return NULL
+    return obj.SortedList([key for key, _ in items], [item for _, item in items])
+
+@builtin
+@pattern("push $item onto $heap")
+@arg("heap", obj.Heap)
+def push_item_onto_heap(args, context):
+    try:
+        args["heap"].push(_Ordered(args["item"], context), args["item"])
+    except obj.SortError as e:
+        return e.error
+
+    return args["heap"]
+
+@builtin
+@pattern("insert sorted $item into $list")
+@arg("list", obj.SortedList)
+def insert_sorted_item_into_list(args, context):
+    try:
+        args["list"].insert(_Ordered(args["item"], context), args["item"])
+    except obj.SortError as e:
+        return e.error
+
+    return args["list"]
+
+@builtin
+@pattern("pop min from $collection")
+def pop_min_from_collection(args, context):
+    collection = args["collection"]
+
+    if type(collection) not in [obj.Heap, obj.SortedList]:
+        return err(context, "can only pop from a heap or a sorted list, not a %s" % collection.type, "TypeError")
+
+    if collection.is_empty():
+        return err(context, "cannot pop from an empty %s" % collection.type, "OutOfBoundsError")
+
+    try:
+        return collection.pop()
+    except obj.SortError as e:
+        return e.error
+
+@builtin
+@pattern("peek $collection")
+def peek_collection(args, context):
+    collection = args["collection"]
+
+    if type(collection) not in [obj.Heap, obj.SortedList]:
+        return err(context, "can only peek at a heap or a sorted list, not a %s" % collection.type, "TypeError")
+
+    if collection.is_empty():
+        return err(context, "cannot peek at an empty %s" % collection.type, "OutOfBoundsError")
+
+    return collection.peek()
+
+@builtin
+@pattern("bisect $item in $sorted")
+@arg("sorted", obj.Collection)
+def bisect_item_in_sorted(args, context):
+    """the index at which item would be inserted to keep sorted in order"""
+    collection = args["sorted"]
+
+    try:
+        key = _Ordered(args["item"], context)
+
+        if type(collection) == obj.SortedList:
+            return obj.number(collection.bisect(key))
+
+        return obj.number(bisect.bisect_left(_OrderedView(collection, context), key))
+    except obj.SortError as e:
+        return e.error
+
+## Deques ##
+
+def _capacity(n, context):
+    if not n.is_integer() or not n.is_positive() or n.value == 0:
+        return err(context, "the capacity of a deque must be a positive integer, not %s" % n, "TypeError")
+
+    return None
+
+@builtin
+@pattern("deque")
+def deque(args, context):
+    return obj.Deque()
+
+@builtin
+@pattern("deque of $collection")
+@arg("collection", obj.Collection)
+def deque_of_collection(args, context):
+    return obj.Deque(args["collection"].iter())
+
+@builtin
+@pattern("deque with capacity $n")
+@arg("n", obj.Number)
+def deque_with_capacity_n(args, context):
+    invalid = _capacity(args["n"], context)
+    if invalid:
+        return invalid
+
+    return obj.Deque(capacity=int(args["n"].value))
+
+@builtin
+@pattern("deque of $collection with capacity $n")
+@arg("collection", obj.Collection)
+@arg("n", obj.Number)
+def deque_of_collection_with_capacity_n(args, context):
+    invalid = _capacity(args["n"], context)
+    if invalid:
+        return invalid
+
+    return obj.Deque(args["collection"].iter(), int(args["n"].value))
+
+@builtin
+@pattern("push $item onto front of $deque")
+@arg("deque", obj.Deque)
+def push_item_onto_front_of_deque(args, context):
+    args["deque"].items.appendleft(args["item"])
+    return args["deque"]
+
+@builtin
+@pattern("push $item onto back of $deque")
+@arg("deque", obj.Deque)
+def push_item_onto_back_of_deque(args, context):
+    args["deque"].items.append(args["item"])
+    return args["deque"]
+
+@builtin
+@pattern("pop front of $deque")
+@arg("deque", obj.Deque)
+def pop_front_of_deque(args, context):
+    if args["deque"].is_empty():
+        return err(context, "cannot pop from an empty deque", "OutOfBoundsError")
+
+    return args["deque"].items.popleft()
+
+@builtin
+@pattern("pop back of $deque")
+@arg("deque", obj.Deque)
+def pop_back_of_deque(args, context):
+    if args["deque"].is_empty():
+        return err(context, "cannot pop from an empty deque", "OutOfBoundsError")
+
+    return args["deque"].items.pop()
+
+## Lazy sequences ##
+#
+# These return Streams, which are only evaluated as they're
+# consumed, so a chain of them runs in a single pass. An error
+# in the pipeline is passed along as an item, and ends it.
+
+def _count(n, context, name):
+    if not n.is_integer() or not n.is_positive():
+        return err(context, "%s must be a non-negative integer, not %s" % (name, n), "TypeError")
+
+    return None
+
+def _lazy_map(block, items, context):
+    for item in items:
+        if is_err(item):
+            yield item
+            return
+
+        mapped = _run_block(block, [item], context)
+        yield mapped
+
+        if is_err(mapped):
+            return
+
+def _lazy_filter(predicate, items, context):
+    for item in items:
+        if is_err(item):
+            yield item
+            return
+
+        result = _run_block(predicate, [item], context)
+
+        if is_err(result):
+            yield result
+            return
+
+        if is_truthy(result):
+            yield item
+
+def _take(n, items):
+    for _ in range(n):
+        item = next(items, None)
+
+        if item == None:
+            return
+
+        yield item
+
+        if is_err(item):
+            return
+
+def _drop(n, items):
+    for item in items:
+        if is_err(item):
+            yield item
+            return
+
+        if n > 0:
+            n -= 1
+            continue
+
+        yield item
+
+def _chunk(n, items):
+    chunk = []
+
+    for item in items:
+        if is_err(item):
+            yield item
+            return
+
+        chunk.append(item)
+
+        if len(chunk) == n:
+            yield obj.Array(chunk)
+            chunk = []
+
+    if len(chunk) > 0:
+        yield obj.Array(chunk)
+
+def _zip(a, b):
+    for pair in zip(a, b):
+        for item in pair:
+            if is_err(item):
+                yield item
+                return
+
+        yield obj.Tuple(list(pair))
+
+def _enumerate(items):
+    for i, item in enumerate(items):
+        if is_err(item):
+            yield item
+            return
+
+        yield obj.Tuple([obj.number(i), item])
+
+@builtin
+@pattern("lazy map $block over $collection")
+@arg("block", obj.Block)
+@arg("collection", obj.Collection)
+def lazy_map_block_over_collection(args, context):
+    return obj.Stream(_lazy_map(args["block"], args["collection"].iter(), context))
+
+@builtin
+@pattern("lazy filter $collection by $predicate")
+@arg("collection", obj.Collection)
+@arg("predicate", obj.Block)
+def lazy_filter_collection_by_predicate(args, context):
+    return obj.Stream(_lazy_filter(args["predicate"], args["collection"].iter(), context))
+
+@builtin
+@pattern("take $n from $collection")
+@arg("n", obj.Number)
+@arg("collection", obj.Collection)
+def take_n_from_collection(args, context):
+    invalid = _count(args["n"], context, "$n")
+    if invalid:
+        return invalid
+
+    return obj.Stream(_take(int(args["n"].value), args["collection"].iter()))
+
+@builtin
+@pattern("drop $n from $collection")
+@arg("n", obj.Number)
+@arg("collection", obj.Collection)
+def drop_n_from_collection(args, context):
+    invalid = _count(args["n"], context, "$n")
+    if invalid:
+        return invalid
+
+    return obj.Stream(_drop(int(args["n"].value), args["collection"].iter()))
+
+@builtin
+@pattern("chunk $n of $collection")
+@arg("n", obj.Number)
+@arg("collection", obj.Collection)
+def chunk_n_of_collection(args, context):
+    invalid = _count(args["n"], context, "$n")
+    if invalid:
+        return invalid
+
+    if args["n"].value == 0:
+        return err(context, "$n in `chunk $n of $collection` cannot be zero", "GeneralError")
+
+    return obj.Stream(_chunk(int(args["n"].value), args["collection"].iter()))
+
+@builtin
+@pattern("zip $a with $b")
+@arg("a", obj.Collection)
+@arg("b", obj.Collection)
+def zip_a_with_b(args, context):
+    return obj.Stream(_zip(args["a"].iter(), args["b"].iter()))
+
+@builtin
+@pattern("enumerate $collection")
+@arg("collection", obj.Collection)
+def enumerate_collection(args, context):
+    return obj.Stream(_enumerate(args["collection"].iter()))
+
+@builtin
+@pattern("collect $collection")
+@arg("collection", obj.Collection)
+def collect_collection(args, context):
+    collected = []
+
+    for item in args["collection"].iter():
+        if is_err(item):
+            return item
+
+        collected.append(item)
+
+    return obj.Array(collected)
+
+@builtin
+@pattern("key $key of $obj")
+@arg("obj", obj.Map)
+def key_of_obj(args, context):
+    key = args["key"]
+    obj = args["obj"]
+
+    if key not in obj.pairs.keys():
+        return err("key %s not found" % key, "NotFoundError")
+
+    return obj.pairs[key]
+
+@builtin
+@pattern("keys of $obj")
+@arg("obj", obj.Map)
+def keys_of_obj(args, context):
+    return obj.Array(list(args["obj"].pairs.keys()))
+
+@builtin
+@pattern("values of $obj")
+@arg("obj", obj.Map)
+def values_of_obj(args, context):
+    return obj.Array(list(args["obj"].pairs.values()))
+
+@builtin
+@pattern("pairs of $obj")
+@arg("obj", obj.Map)
+def pairs_of_obj(args, context):
+    o = args["obj"]
+    pairs = []
+
+    for (key, value) in o.pairs.items():
+        pairs.append(obj.Tuple([key, value]))
+
+    return obj.Array(pairs)
+
+@builtin
+@pattern("string builder")
+def string_builder(args, context):
+    return obj.StringBuilder()
+
+@builtin
+@pattern("write $obj to $target")
+def write_obj_to_target(args, context):
+    """writes obj to a string builder or a file"""
+    target = args["target"]
+
+    if type(target) == obj.File:
+        invalid = _check_file(target, "write to", context)
+        if invalid:
+            return invalid
+
+        try:
+            target.write(args["obj"])
+        except OSError as e:
+            return err(context, "could not write to %s: %s" % (target.path, e.strerror), "IOError")
+
+        return target
+
+    if type(target) != obj.StringBuilder:
+        return err(context, "can only write to a string builder or a file, not a %s" % target.type, "TypeError")
+
+    target.write(args["obj"])
+    return target
+
+@builtin
+@pattern("string of $builder")
+@arg("builder", obj.StringBuilder)
+def string_of_builder(args, context):
+    return obj.String(args["builder"].build())
+
+@builtin
+@pattern("$start to $end")
+@arg("start", obj.Number)
+@arg("end", obj.Number)
+def start_to_end(args, context):
+    start = args["start"]
+    end = args["end"]
+
+    if not start.is_integer():
+        return err(context, "$start in `$start to $end` must be an integer", "TypeError")
+
+    if not end.is_integer():
+        return err(context, "$end in `$start to $end` must be an integer", "TypeError")
+
+    s_val = int(start.value)
+    e_val = int(end.value)
+
+    return obj.Range(range(s_val, e_val, 1 if e_val >= s_val else -1))
+
+@builtin
+@pattern("$start to $end by $step")
+@arg("start", obj.Number)
+@arg("end", obj.Number)
+@arg("step", obj.Number)
+def start_to_end_by_step(args, context):
+    start = args["start"]
+    end = args["end"]
+    step = args["step"]
+
+    if not start.is_integer() or not end.is_integer() or not step.is_integer():
+        return err(context, "the arguments of `$start to $end by $step` must be integers", "TypeError")
+
+    if step.value == 0:
+        return err(context, "$step in `$start to $end by $step` cannot be zero", "GeneralError")
+
+    return obj.Range(range(int(start.value), int(end.value), int(step.value)))
+
+@builtin
+@pattern("format $format with $args")
+@arg("format", obj.String)
+@arg("args", obj.Collection)
+def format_string_with_args(args, context):
+    fmt = args["format"].value
+    items = tuple(args["args"].get_elements())
+
+    try:
+        return obj.String(fmt % items)
+    except TypeError:
+        return err("Wrong number of arguments to format `%s`" % fmt, "TypeError")
+
+@builtin
+@pattern("printf $format with $args")
+@arg("format", obj.String)
+@arg("args", obj.Collection)
+def printf_format_with_args(args, context):
+    fmt = args["format"].value
+    items = tuple(args["args"].get_elements())
+
+    try:
+        output.write(fmt % items + "\n")
+    except TypeError:
+        return err("Wrong number of arguments to format `%s`" % fmt, "TypeError")
+
+    return NULL
+
+## Files ##
+
+def _open(path, mode, context):
+    try:
+        return obj.File(path.value, mode)
+    except OSError as e:
+        return err(context, "could not open %s: %s" % (path.value, e.strerror), "IOError")
+
+def _check_file(f, action, context):
+    if f.is_closed():
+        return err(context, "cannot %s %s, since it's closed" % (action, f.path), "IOError")
+
+    if (action == "write to") == f.is_readable():
+        return err(context, "cannot %s %s, since it was opened for %s" % (
+            action, f.path, "reading" if f.is_readable() else "writing"
+        ), "IOError")
+
+    return None
+
+def _source_file(source, action, context):
+    """returns an open File for source, which is a File or a path"""
+    if type(source) == obj.String:
+        return _open(source, "r" if action == "read from" else "w", context)
+
+    if type(source) != obj.File:
+        return err(context, "expected a file or a path, but found a %s" % source.type, "TypeError")
+
+    invalid = _check_file(source, action, context)
+    if invalid:
+        return invalid
+
+    return source
+
+def _lines(f, context):
+    try:
+        for line in f.lines():
+            yield obj.String(line)
+    except (OSError, ValueError) as e:
+        yield err(context, "could not read from %s: %s" % (f.path, e), "IOError")
+
+@builtin
+@pattern("open $path")
+@arg("path", obj.String)
+def open_path(args, context):
+    return _open(args["path"], "r", context)
+
+@builtin
+@pattern("open $path for writing")
+@arg("path", obj.String)
+def open_path_for_writing(args, context):
+    return _open(args["path"], "w", context)
+
+@builtin
+@pattern("open $path for appending")
+@arg("path", obj.String)
+def open_path_for_appending(args, context):
+    return _open(args["path"], "a", context)
+
+@builtin
+@pattern("lines of $file")
+@arg("file", obj.File)
+def lines_of_file(args, context):
+    invalid = _check_file(args["file"], "read from", context)
+    if invalid:
+        return invalid
+
+    return obj.Stream(_lines(args["file"], context))
+
+@builtin
+@pattern("read $n bytes from $file")
+@arg("n", obj.Number)
+@arg("file", obj.File)
+def read_n_bytes_from_file(args, context):
+    invalid = _count(args["n"], context, "$n") or _check_file(args["file"], "read from", context)
+    if invalid:
+        return invalid
+
+    try:
+        return obj.Bytes(args["file"].read(int(args["n"].value)))
+    except OSError as e:
+        return err(context, "could not read from %s: %s" % (args["file"].path, e.strerror), "IOError")
+
+@builtin
+@pattern("read all from $file")
+@arg("file", obj.File)
+def read_all_from_file(args, context):
+    invalid = _check_file(args["file"], "read from", context)
+    if invalid:
+        return invalid
+
+    try:
+        return obj.String(args["file"].read().decode("utf-8", "replace"))
+    except OSError as e:
+        return err(context, "could not read from %s: %s" % (args["file"].path, e.strerror), "IOError")
+
+@builtin
+@pattern("close $file")
+@arg("file", obj.File)
+def close_file(args, context):
+    try:
+        args["file"].close()
+    except OSError as e:
+        return err(context, "could not close %s: %s" % (args["file"].path, e.strerror), "IOError")
+
+    return NULL
+
+@builtin
+@pattern("with $file do $block")
+@arg("file", obj.File)
+@arg("block", obj.Block)
+def with_file_do_block(args, context):
+    """runs block with the file, closing it afterwards even if the block fails"""
+    f = args["file"]
+
+    try:
+        result = _run_block(args["block"], [f], context)
+    finally:
+        if not f.is_closed():
+            f.close()
+
+    return result
+
+## Bytes ##
+
+def _decode(b, encoding, context):
+    try:
+        return obj.String(b.decode(encoding))
+    except LookupError:
+        return err(context, "unknown encoding: %s" % encoding, "NotFoundError")
+    except UnicodeDecodeError as e:
+        return err(context, "could not decode the bytes as %s: %s" % (encoding, e.reason), "TypeError")
+
+def _encode(s, encoding, context):
+    try:
+        return obj.Bytes(s.value.encode(encoding))
+    except LookupError:
+        return err(context, "unknown encoding: %s" % encoding, "NotFoundError")
+    except UnicodeEncodeError as e:
+        return err(context, "could not encode the string as %s: %s" % (encoding, e.reason), "TypeError")
+
+@builtin
+@pattern("mmap $path")
+@arg("path", obj.String)
+def mmap_path(args, context):
+    """maps the file at path into memory, read-only, so it's only read as it's used"""
+    path = args["path"].value
+
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return obj.Bytes(b"")
+
+            return obj.Bytes(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except OSError as e:
+        return err(context, "could not map %s: %s" % (path, e.strerror), "IOError")
+
+@builtin
+@pattern("bytes of $value")
+def bytes_of_value(args, context):
+    """encodes a string as utf-8, or makes bytes from a collection of numbers"""
+    value = args["value"]
+
+    if type(value) in [obj.String, obj.Char]:
+        return _encode(value, "utf-8", context)
+
+    if not isinstance(value, obj.Collection):
+        return err(context, "cannot make bytes from a %s" % value.type, "TypeError")
+
+    values = _numbers(value, context)
+    if is_err(values):
+        return values
+
+    if not all(type(v) == int or v.is_integer() for v in values):
+        return err(context, "bytes must be integers from 0 to 255", "TypeError")
+
+    try:
+        return obj.Bytes(bytes(int(v) for v in values))
+    except ValueError:
+        return err(context, "bytes must be integers from 0 to 255", "TypeError")
+
+@builtin
+@pattern("decode $bytes")
+@arg("bytes", obj.Bytes)
+def decode_bytes(args, context):
+    return _decode(args["bytes"], "utf-8", context)
+
+@builtin
+@pattern("decode $bytes as $encoding")
+@arg("bytes", obj.Bytes)
+@arg("encoding", obj.String)
+def decode_bytes_as_encoding(args, context):
+    return _decode(args["bytes"], args["encoding"].value, context)
+
+@builtin
+@pattern("encode $string as $encoding")
+@arg("string", obj.String)
+@arg("encoding", obj.String)
+def encode_string_as_encoding(args, context):
+    return _encode(args["string"], args["encoding"].value, context)
+
+@builtin
+@pattern("find $needle in $bytes")
+@arg("bytes", obj.Bytes)
+def find_needle_in_bytes(args, context):
+    """the index of needle, which is bytes or a byte value, or -1 if it isn't there"""
+    needle = args["needle"]
+
+    if type(needle) == obj.Bytes:
+        return obj.number(args["bytes"].find(needle.view()))
+
+    if type(needle) == obj.Number and needle.value in range(256):
+        return obj.number(args["bytes"].find(bytes([int(needle.value)])))
+
+    return err(context, "can only find bytes or a byte value, not a %s" % needle.type, "TypeError")
+
+## CSV ##
+#
+# The csv builtins take either an open file or a path. Rows are
+# read lazily through the file's buffer, so only as much of the
+# file as is needed is in memory at once.
+
+class _TextWriter(object):
+    """lets the csv module write text to a File"""
+    def __init__(self, f):
+        self.file = f
+
+    def write(self, text):
+        self.file.handle.write(text.encode("utf-8"))
+
+def _csv_reader(f):
+    # the lines keep their newlines, so quoted fields can span lines
+    return csv.reader(line.decode("utf-8") for line in f.handle)
+
+def _csv_rows(f, close, with_header, context):
+    try:
+        reader = _csv_reader(f)
+        header = None
+
+        if with_header:
+            header = [obj.String(name) for name in next(reader, [])]
+
+        for row in reader:
+            fields = [obj.String(field) for field in row]
+
+            if header == None:
+                yield obj.Tuple(fields)
+            else:
+                yield obj.Map(zip(header, fields))
+    except (csv.Error, OSError, ValueError) as e:
+        yield err(context, "could not read csv from %s: %s" % (f.path, e), "IOError")
+    finally:
+        if close:
+            f.close()
+
+# Only plain decimal numbers in a csv field are converted, so
+# text like "1_000", "nan" or "inf" stays a string.
+csv_number = re.compile(r"-?\d+(\.\d+)?([eE][-+]?\d+)?")
+
+def _csv_value(text):
+    """the number text holds, or None if it isn't one"""
+    match = csv_number.fullmatch(text)
+
+    if match == None:
+        return None
+
+    if match.group(1) == None and match.group(2) == None:
+        return int(text)
+
+    return float(text)
+
+def _csv_column(values):
+    """
+        a numeric array if every value is a number which fits in
+        one, an array of numbers if they don't fit, or otherwise
+        an array of strings
+    """
+    numbers = []
+
+    for text in values:
+        n = _csv_value(text)
+
+        if n == None:
+            return obj.Array([obj.String(text) for text in values])
+
+        numbers.append(n)
+
+    try:
+        return obj.numeric(numbers)
+    except OverflowError:
+        return obj.Array([obj.number(n) for n in numbers])
+
+@builtin
+@pattern("csv rows of $file")
+def csv_rows_of_file(args, context):
+    """a lazy stream of each row of the file as a tuple of strings"""
+    f = _source_file(args["file"], "read from", context)
+    if is_err(f):
+        return f
+
+    return obj.Stream(_csv_rows(f, type(args["file"]) == obj.String, False, context))
+
+@builtin
+@pattern("csv records of $file")
+def csv_records_of_file(args, context):
+    """a lazy stream of each row after the header, as a map from the header's fields"""
+    f = _source_file(args["file"], "read from", context)
+    if is_err(f):
+        return f
+
+    return obj.Stream(_csv_rows(f, type(args["file"]) == obj.String, True, context))
+
+@builtin
+@pattern("csv columns of $file")
+def csv_columns_of_file(args, context):
+    """a map from each field of the header to its column, which is a numeric array if it can be"""
+    f = _source_file(args["file"], "read from", context)
+    if is_err(f):
+        return f
+
+    try:
+        reader = _csv_reader(f)
+        header = next(reader, [])
+        columns = [[] for _ in header]
+
+        for row in reader:
+            if len(row) != len(header):
+                return err(context, "line %s of %s has %s fields, but the header has %s" % (
+                    reader.line_num, f.path, len(row), len(header)
+                ), "TypeError")
+
+            for column, field in zip(columns, row):
+                column.append(field)
+    except (csv.Error, OSError, ValueError) as e:
+        return err(context, "could not read csv from %s: %s" % (f.path, e), "IOError")
+    finally:
+        if type(args["file"]) == obj.String:
+            f.close()
+
+    return obj.Map((obj.String(name), _csv_column(column)) for name, column in zip(header, columns))
+
+@builtin
+@pattern("write csv $rows to $file")
+@arg("rows", obj.Collection)
+def write_csv_rows_to_file(args, context):
+    """writes each row, which is a collection, as a line of csv"""
+    f = _source_file(args["file"], "write to", context)
+    if is_err(f):
+        return f
+
+    writer = csv.writer(_TextWriter(f))
+
+    try:
+        for row in args["rows"].iter():
+            if is_err(row):
+                return row
+
+            if not isinstance(row, obj.Collection):
+                return err(context, "each row must be a collection, not a %s" % row.type, "TypeError")
+
+            writer.writerow([e.value if type(e) in [obj.String, obj.Char] else str(e) for e in row.iter()])
+    except OSError as e:
+        return err(context, "could not write to %s: %s" % (f.path, e.strerror), "IOError")
+    finally:
+        if type(args["file"]) == obj.String:
+            f.close()
+
+    return f
+
+## JSON ##
+
+class _JSONError(Exception):
+    """raised when a value can't be converted to or from json"""
+    pass
+
+def _from_json(value):
+    """converts a value decoded by the json module into a pluto object"""
+    t = type(value)
+
+    if t == str:
+        return obj.String(value)
+
+    if t == bool:
+        return TRUE if value else FALSE
+
+    if t == int or t == float:
+        return obj.number(value)
+
+    if t == list:
+        return obj.Array([_from_json(item) for item in value])
+
+    if t == dict:
+        return obj.Map((obj.String(k), _from_json(v)) for k, v in value.items())
+
+    return NULL
+
+def _to_json(o):
+    """converts a pluto object into values the json module can encode"""
+    t = type(o)
+
+    if t == obj.String or t == obj.Char:
+        return o.value
+
+    if t == obj.Number:
+        return o.value
+
+    if t == obj.Boolean:
+        return o.value
+
+    if t == obj.Null:
+        return None
+
+    if t == obj.NumArray:
+        return o.data.tolist()
+
+    if t == obj.Map:
+        result = {}
+
+        for key, value in o.pairs.items():
+            if type(key) not in [obj.String, obj.Char, obj.Number]:
+                raise _JSONError("a key in json must be a string or a number, not a %s" % key.type)
+
+            result[key.value] = _to_json(value)
+
+        return result
+
+    if isinstance(o, obj.Collection):
+        return [_to_json(item) for item in o.iter()]
+
+    raise _JSONError("a %s can't be converted to json" % o.type)
+
+def _json_items(f, close, context):
+    """
+        yields each element of the array at the top level of
+        f, reading the file a chunk at a time so that only the
+        element being decoded needs to be in memory
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    eof = False
+    base_chunk = 1 << 16
+    chunk = base_chunk
+
+    def more():
+        nonlocal buf, pos, eof, chunk
+
+        data = f.handle.read(chunk)
+        eof = len(data) == 0
+        buf = buf[pos:] + text_decoder.decode(data, eof)
+        pos = 0
+
+        return not eof
+
+    def skip_space():
+        nonlocal pos
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+
+            if pos < len(buf) or not more():
+                return buf[pos] if pos < len(buf) else ""
+
+    try:
+        if skip_space() != "[":
+            raise _JSONError("the file must hold a json array")
+
+        pos += 1
+        first = True
+
+        while True:
+            c = skip_space()
+
+            if c == "]":
+                return
+
+            if not first:
+                if c != ",":
+                    raise _JSONError("expected , or ] at character %s" % pos)
+
+                pos += 1
+                skip_space()
+
+            first = False
+
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+
+                    # a number might carry on into the next chunk
+                    if end < len(buf) or eof:
+                        break
+                except json.JSONDecodeError as e:
+                    if eof:
+                        raise _JSONError(e.msg)
+
+                if not more():
+                    continue
+
+                # the element is still incomplete, so read more at once
+                # rather than re-decoding it after every small read
+                chunk *= 2
+
+            # only this element needed the bigger reads
+            chunk = base_chunk
+            pos = end
+            yield _from_json(value)
+    except (_JSONError, OSError, UnicodeDecodeError) as e:
+        yield err(context, "could not read json from %s: %s" % (f.path, e), "IOError")
+    finally:
+        if close:
+            f.close()
+
+@builtin
+@pattern("parse json $string")
+@arg("string", obj.String)
+def parse_json_string(args, context):
+    try:
+        return _from_json(json.loads(args["string"].value))
+    except json.JSONDecodeError as e:
+        return err(context, "invalid json: %s at character %s" % (e.msg, e.pos), "SyntaxError")
+
+@builtin
+@pattern("json of $value")
+def json_of_value(args, context):
+    try:
+        return obj.String(json.dumps(_to_json(args["value"]), allow_nan=False))
+    except _JSONError as e:
+        return err(context, str(e), "TypeError")
+    except ValueError:
+        return err(context, "infinite and nan numbers can't be converted to json", "TypeError")
+
+@builtin
+@pattern("json items of $file")
+def json_items_of_file(args, context):
+    """a lazy stream of the elements of the json array in file, which is an open file or a path"""
+    f = _source_file(args["file"], "read from", context)
+    if is_err(f):
+        return f
+
+    return obj.Stream(_json_items(f, type(args["file"]) == obj.String, context))
+
+## Regular expressions ##
+#
+# Wherever a regex is expected, either a regex made by `regex $pattern`
+# or a string holding a pattern can be given. Either way, compiled
+# patterns come from the cache in regex_cache.
+
+def _compile(pattern, flags, context):
+    try:
+        return regex_cache.cache.compile(pattern, flags)
+    except ValueError as e:
+        return err(context, str(e), "TypeError")
+    except re.error as e:
+        return err(context, "invalid regex /%s/: %s" % (pattern, e), "SyntaxError")
+
+def _regex(re_obj, context):
+    """the compiled pattern for re_obj, which is a regex or a string, or an error"""
+    if type(re_obj) == obj.Regex:
+        return re_obj.compiled
+
+    if type(re_obj) == obj.String:
+        return _compile(re_obj.value, "", context)
+
+    return err(context, "expected a regex or a string, but found a %s" % re_obj.type, "TypeError")
+
+def _match_value(m):
+    """what find all gives for a match: the whole match, or the groups if there are any"""
+    if m.re.groups == 0:
+        return obj.String(m.group(0))
+
+    if m.re.groups == 1:
+        return obj.String(m.group(1) or "")
+
+    return obj.Tuple([obj.String(g or "") for g in m.groups()])
+
+@builtin
+@pattern("regex $pattern")
+@arg("pattern", obj.String)
+def regex_pattern(args, context):
+    compiled = _compile(args["pattern"].value, "", context)
+    if is_err(compiled):
+        return compiled
+
+    return obj.Regex(compiled, "")
+
+@builtin
+@pattern("regex $pattern with flags $flags")
+@arg("pattern", obj.String)
+@arg("flags", obj.String)
+def regex_pattern_with_flags(args, context):
+    compiled = _compile(args["pattern"].value, args["flags"].value, context)
+    if is_err(compiled):
+        return compiled
+
+    return obj.Regex(compiled, args["flags"].value)
+
+@builtin
+@pattern("$s matches $re")
+@arg("s", obj.String)
+def s_matches_re(args, context):
+    """whether the regex matches anywhere in s"""
+    compiled = _regex(args["re"], context)
+    if is_err(compiled):
+        return compiled
+
+    return TRUE if compiled.search(args["s"].value) else FALSE
+
+@builtin
+@pattern("find all $re in $s")
+@arg("s", obj.String)
+def find_all_re_in_s(args, context):
+    compiled = _regex(args["re"], context)
+    if is_err(compiled):
+        return compiled
+
+    return obj.Array([_match_value(m) for m in compiled.finditer(args["s"].value)])
+
+@builtin
+@pattern("lazy find all $re in $s")
+@arg("s", obj.String)
+def lazy_find_all_re_in_s(args, context):
+    """like find all, but the matches are found as they're consumed"""
+    compiled = _regex(args["re"], context)
+    if is_err(compiled):
+        return compiled
+
+    return obj.Stream(map(_match_value, compiled.finditer(args["s"].value)))
+
+@builtin
+@pattern("replace $re in $s with $replacement")
+@arg("s", obj.String)
+def replace_re_in_s_with_replacement(args, context):
+    """
+        replaces each match. the replacement is either a string,
+        which can refer to groups like \\1, or a block which is
+        given the matched string
+    """
+    compiled = _regex(args["re"], context)
+    if is_err(compiled):
+        return compiled
+
+    replacement = args["replacement"]
+
+    if type(replacement) == obj.String:
+        try:
+            return obj.String(compiled.sub(replacement.value, args["s"].value))
+        except re.error as e:
+            return err(context, "invalid replacement: %s" % e, "SyntaxError")
+
+    if type(replacement) != obj.Block:
+        return err(context, "the replacement must be a string or a block, not a %s" % replacement.type, "TypeError")
+
+    class Failed(Exception):
+        pass
+
+    def replace(m):
+        result = _run_block(replacement, [obj.String(m.group(0))], context)
+
+        if is_err(result):
+            raise Failed(result)
+
+        return result.value if type(result) in [obj.String, obj.Char] else str(result)
+
+    try:
+        return obj.String(compiled.sub(replace, args["s"].value))
+    except Failed as e:
+        return e.args[0]
+
+@builtin
+@pattern("regex cache stats")
+def regex_cache_stats(args, context):
+    """a map of how well the regex cache is doing"""
+    cache = regex_cache.cache
+
+    return obj.Map([
+        (obj.String("hits"), obj.number(cache.hits)),
+        (obj.String("misses"), obj.number(cache.misses)),
+        (obj.String("evictions"), obj.number(cache.evictions)),
+        (obj.String("size"), obj.number(len(cache.patterns))),
+        (obj.String("capacity"), obj.number(cache.capacity))
+    ])
+
+@builtin
+@pattern("clear regex cache")
+def clear_regex_cache(args, context):
+    regex_cache.cache.clear()
+    return NULL
+
+## Strings ##
+#
+# These work on the python strings underneath, rather than
+# on a character at a time.
+
+def _text(o, context, name):
+    """the python string in a string or char, or an error"""
+    if type(o) == obj.String or type(o) == obj.Char:
+        return o.value
+
+    return err(context, "%s must be a string or a char, not a %s" % (name, o.type), "TypeError")
+
+@builtin
+@pattern("split $s")
+@arg("s", obj.String)
+def split_s(args, context):
+    """splits s at each run of whitespace"""
+    return obj.Array([obj.String(part) for part in args["s"].value.split()])
+
+@builtin
+@pattern("split $s by $sep")
+@arg("s", obj.String)
+def split_s_by_sep(args, context):
+    """splits s at each occurrence of sep, which is a string, a char or a regex"""
+    sep = args["sep"]
+
+    if type(sep) == obj.Regex:
+        parts = sep.compiled.split(args["s"].value)
+        return obj.Array([obj.String(part or "") for part in parts])
+
+    sep = _text(sep, context, "the separator")
+    if is_err(sep):
+        return sep
+
+    if sep == "":
+        return err(context, "cannot split by an empty separator", "TypeError")
+
+    return obj.Array([obj.String(part) for part in args["s"].value.split(sep)])
+
+@builtin
+@pattern("join $xs with $sep")
+@arg("xs", obj.Collection)
+def join_xs_with_sep(args, context):
+    sep = _text(args["sep"], context, "the separator")
+    if is_err(sep):
+        return sep
+
+    parts = []
+
+    for item in args["xs"].iter():
+        if is_err(item):
+            return item
+
+        parts.append(item.value if type(item) in [obj.String, obj.Char] else str(item))
+
+    return obj.String(sep.join(parts))
+
+@builtin
+@pattern("replace $old with $new in $s")
+@arg("s", obj.String)
+def replace_old_with_new_in_s(args, context):
+    old = _text(args["old"], context, "the string to replace")
+    if is_err(old):
+        return old
+
+    new = _text(args["new"], context, "the replacement")
+    if is_err(new):
+        return new
+
+    return obj.String(args["s"].value.replace(old, new))
+
+@builtin
+@pattern("index of $sub in $s")
+@arg("s", obj.String)
+def index_of_sub_in_s(args, context):
+    """the index of the first occurrence of sub in s, or -1"""
+    sub = _text(args["sub"], context, "the substring")
+    if is_err(sub):
+        return sub
+
+    return obj.number(args["s"].value.find(sub))
+
+@builtin
+@pattern("trim $s")
+@arg("s", obj.String)
+def trim_s(args, context):
+    return obj.String(args["s"].value.strip())
+
+@builtin
+@pattern("upper $s")
+@arg("s", obj.String)
+def upper_s(args, context):
+    return obj.String(args["s"].value.upper())
+
+@builtin
+@pattern("lower $s")
+@arg("s", obj.String)
+def lower_s(args, context):
+    return obj.String(args["s"].value.lower())
+
+@builtin
+@pattern("substring $s from $start to $end")
+@arg("s", obj.String)
+@arg("start", obj.Number)
+@arg("end", obj.Number)
+def substring_s_from_start_to_end(args, context):
+    """the characters of s from start up to end, as a view which shares s's buffer"""
+    start, end = args["start"], args["end"]
+
+    if not start.is_integer() or not start.is_positive():
+        return err(context, "invalid start index: %s" % start, "OutOfBoundsError")
+
+    if not end.is_integer() or not end.is_positive():
+        return err(context, "invalid end index: %s" % end, "OutOfBoundsError")
+
+    return args["s"].slice(int(start.value), int(end.value))
 
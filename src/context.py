@@ -14,6 +14,14 @@ class Context(object):
         ctx.outer = self
         return ctx
 
+    def copy(self):
+        """a context with the same variables and functions, which can be changed without affecting this one"""
+        ctx = Context()
+        ctx.store = dict(self.store)
+        ctx.functions = list(self.functions)
+        ctx.outer = self.outer
+        return ctx
+
     """args is a dictionary of strings to objects"""
     def enclose_with_args(self, args):
         ctx = self.enclose()
@@ -1,7 +1,10 @@
 import obj
 import ast
 import math
+import linalg
 import types
+import weakref
+import operator
 
 NULL  = obj.Null()
 TRUE  = obj.Boolean(True)
@@ -26,6 +29,29 @@ overloadable_infixes = {
     ".":  "__get $"
 }
 
+def divide(l, r):
+    """l / r, which stays an int if both are ints and r divides l exactly"""
+    if type(l) == int and type(r) == int and r != 0 and l % r == 0:
+        return l // r
+
+    return l / r
+
+# Operators which act elementwise on numeric arrays.
+# Comparisons give arrays of 1s and 0s.
+numeric_ops = {
+    "+":  operator.add,
+    "-":  operator.sub,
+    "*":  operator.mul,
+    "/":  divide,
+    "**": operator.pow,
+    "//": operator.floordiv,
+    "%":  operator.mod,
+    "<":  lambda l, r: int(l < r),
+    ">":  lambda l, r: int(l > r),
+    "<=": lambda l, r: int(l <= r),
+    ">=": lambda l, r: int(l >= r)
+}
+
 overloadable_prefixes = {
     "+": "__no_op",
     "-": "__negate",
@@ -49,13 +75,16 @@ def evaluate(node, ctx):
 
     # Literals
     if t == ast.Null:                 return NULL
-    if t == ast.Number:               return obj.Number(node.value)
-    if t == ast.String:               return obj.String(node.value)
-    if t == ast.Char:                 return obj.Char(node.value)
+    if t == ast.Number:               return eval_literal(node, obj.number)
+    if t == ast.String:               return eval_literal(node, obj.String)
+    if t == ast.Char:                 return obj.char(node.value)
     if t == ast.Boolean:              return bool_obj(node.value)
     if t == ast.Identifier:           return eval_id(node, ctx)
     if t == ast.BlockLiteral:         return eval_block(node, ctx)
 
+    if t == ast.YieldStatement:
+        return err(ctx, "yield can only be used inside a function or a block", "SyntaxError")
+
     if t == ast.NextStatement:        return NEXT
     if t == ast.BreakStatement:       return BREAK
 
@@ -213,6 +242,14 @@ def eval_id(node, ctx):
 
     return err(ctx, "`%s` is not defined in the current context" % node.value, "NotFoundError")
 
+def eval_literal(node, box):
+    # literals are immutable, so each node is boxed once
+    # and the same object is returned every time
+    if node.boxed == None:
+        node.boxed = box(node.value)
+
+    return node.boxed
+
 def eval_prefix(op, right, ctx):
     if isinstance(right, obj.Instance):
         return eval_instance_prefix(op, right, ctx)
@@ -234,13 +271,19 @@ def eval_instance_prefix(op, right, ctx):
 
         enclosed = ctx.enclose_with_args(args)
 
-        return evaluate(method.fn.body, enclosed)
+        return eval_body(method.fn.body, enclosed)
     
     return err(ctx, "unknown operator: %s %s" % (op, right.base), "NotFoundError")
 
 def eval_minus_prefix(right, ctx):
+    if right.type == obj.NUMARRAY:
+        try:
+            return obj.numeric([-n for n in right.data])
+        except OverflowError:
+            return err(ctx, "the result of -%s is too large for a numeric array" % right.type, "GeneralError")
+
     if right.type != obj.NUMBER: return err(ctx, "unknown operator: -%s" % right.type, "NotFoundError")
-    return obj.Number(-right.value)
+    return obj.number(-right.value)
 
 def eval_assign(left, right, ctx):
     if type(left) != ast.Identifier:
@@ -259,6 +302,18 @@ def eval_declare(left, right, ctx):
     return right
 
 def eval_infix(op, left, right, ctx):
+    if type(left) == obj.Number and type(right) == obj.Number:
+        return eval_number_infix(op, left, right, ctx)
+
+    if op in numeric_ops and (
+       type(left) == obj.NumArray and type(right) in [obj.NumArray, obj.Number] or
+       type(left) == obj.Number and type(right) == obj.NumArray):
+        return eval_numeric_infix(op, left, right, ctx)
+
+    if type(left) == obj.Matrix or type(right) == obj.Matrix and not isinstance(left, obj.Instance):
+        if op in ["+", "-", "*", "/"]:
+            return eval_matrix_infix(op, left, right, ctx)
+
     if isinstance(left, obj.Collection) and isinstance(right, obj.Collection):
         return eval_collection_infix(op, left, right, ctx)
         
@@ -274,9 +329,6 @@ def eval_infix(op, left, right, ctx):
     if op == "?":
         return right if left == NULL else left
 
-    if type(left) == obj.Number and type(right) == obj.Number:
-        return eval_number_infix(op, left, right, ctx)
-
     if (type(left) == obj.Char and type(right) == obj.Char or
        type(left) == obj.String and type(right) == obj.Char or
        type(left) == obj.Char and type(right) == obj.String):
@@ -293,7 +345,7 @@ def eval_infix(op, left, right, ctx):
         for _ in range(n):
             result += elems[:]
 
-        return type(left)(result)
+        return left.rebuild(result)
 
     return err(ctx, "unknown operator: %s %s %s" % (left.type, op, right.type), "NotFoundError")
 
@@ -317,15 +369,20 @@ def eval_instance_infix(op, left, right, ctx):
 
         enclosed = ctx.enclose_with_args(args)
 
-        return evaluate(method.fn.body, enclosed)
+        return eval_body(method.fn.body, enclosed)
     
     return err(ctx, "unknown operator: %s %s %s" % (left.base, op, right.type), "NotFoundError")
 
 def eval_char_string_infix(op, left, right, ctx):
+    if op == "+":
+        if type(left) == obj.String:
+            return left.concat(right.value)
+
+        return obj.String(left.value).concat(right if type(right) == obj.String else right.value)
+
     l = left.value
     r = right.value
 
-    if op == "+": return obj.String(l + r)
     if op == "-": return obj.String([ch for ch in l if ch != r])
 
     return err(ctx, "unknown operator: %s %s %s" % (left.type, op, right.type), "NotFoundError")
@@ -334,33 +391,122 @@ def eval_number_infix(op, left, right, ctx):
     l = left.value
     r = right.value
 
-    if op == "+":  return obj.Number(l + r)
-    if op == "-":  return obj.Number(l - r)
-    if op == "*":  return obj.Number(l * r)
-    if op == "/":  return obj.Number(l / r)
-    if op == "&":  return obj.Number(int(l) & int(r))
-    if op == "|":  return obj.Number(int(l) | int(r))
-    if op == "**": return obj.Number(l ** r)
-    if op == "//": return obj.Number(l // r)
-    if op == "%":  return obj.Number(l % r)
-
-    if op == "<":  return bool_obj(l < r)
-    if op == ">":  return bool_obj(l > r)
-    if op == "<=": return bool_obj(l <= r)
-    if op == ">=": return bool_obj(l >= r)
+    # ints stay exact as long as both operands are ints,
+    # otherwise the result is promoted to a float
+    ints = type(l) == int and type(r) == int
+
+    if op == "==": return TRUE if l == r else FALSE
+    if op == "!=": return TRUE if l != r else FALSE
+    if op == "&&": return TRUE if l != 0 and r != 0 else FALSE
+    if op == "||": return TRUE if l != 0 or r != 0 else FALSE
+    if op == "?":  return left
+
+    try:
+        if op == "+":  return obj.number(l + r)
+        if op == "-":  return obj.number(l - r)
+        if op == "*":  return obj.number(l * r)
+        if op == "&":  return obj.number(l & r if ints else int(l) & int(r))
+        if op == "|":  return obj.number(l | r if ints else int(l) | int(r))
+        if op == "/":  return obj.number(divide(l, r))
+        if op == "//": return obj.number(l // r)
+        if op == "%":  return obj.number(l % r)
+
+        if op == "**":
+            result = float(l) ** r if ints and r < 0 else l ** r
+
+            if type(result) == complex:
+                return err(ctx, "%s ** %s is not a real number" % (left, right), "GeneralError")
+
+            return obj.number(result)
+    except ZeroDivisionError:
+        return err(ctx, "division by zero in %s %s %s" % (left.type, op, right.type), "GeneralError")
+    except OverflowError:
+        return err(ctx, "the result of %s %s %s is too large to represent" % (left.type, op, right.type), "GeneralError")
+
+    if op == "<":  return TRUE if l < r else FALSE
+    if op == ">":  return TRUE if l > r else FALSE
+    if op == "<=": return TRUE if l <= r else FALSE
+    if op == ">=": return TRUE if l >= r else FALSE
+
+    return err(ctx, "unknown operator: %s %s %s" % (left.type, op, right.type), "NotFoundError")
+
+def eval_numeric_infix(op, left, right, ctx):
+    fn = numeric_ops[op]
+
+    try:
+        if type(left) == obj.NumArray and type(right) == obj.NumArray:
+            if left.length() != right.length():
+                return err(ctx, "cannot use %s on numeric arrays of lengths %s and %s" % (
+                    op, left.length(), right.length()
+                ), "TypeError")
+
+            return obj.numeric(list(map(fn, left.data, right.data)))
+
+        if type(left) == obj.NumArray:
+            r = right.value
+            return obj.numeric([fn(l, r) for l in left.data])
+
+        l = left.value
+        return obj.numeric([fn(l, r) for r in right.data])
+    except ZeroDivisionError:
+        return err(ctx, "division by zero in %s %s %s" % (left.type, op, right.type), "GeneralError")
+    except OverflowError:
+        return err(ctx, "the result of %s %s %s is too large for a numeric array" % (left.type, op, right.type), "GeneralError")
+    except TypeError:
+        # a negative number to a fractional power is complex
+        return err(ctx, "%s %s %s gives numbers which aren't real" % (left.type, op, right.type), "GeneralError")
+
+def eval_matrix_infix(op, left, right, ctx):
+    fn = numeric_ops[op]
+
+    try:
+        if type(left) == obj.Matrix and type(right) == obj.Matrix:
+            if op == "*":
+                if left.cols != right.rows:
+                    return err(ctx, "cannot multiply a %sx%s matrix by a %sx%s matrix" % (
+                        left.rows, left.cols, right.rows, right.cols
+                    ), "TypeError")
+
+                return linalg.matmul(left, right)
+
+            if op == "/" or (left.rows, left.cols) != (right.rows, right.cols):
+                return err(ctx, "cannot use %s on a %sx%s matrix and a %sx%s matrix" % (
+                    op, left.rows, left.cols, right.rows, right.cols
+                ), "TypeError")
+
+            return linalg.elementwise(fn, left, right)
+
+        if type(left) == obj.Matrix and type(right) == obj.NumArray and op == "*":
+            if left.cols != right.length():
+                return err(ctx, "cannot multiply a %sx%s matrix by a vector of length %s" % (
+                    left.rows, left.cols, right.length()
+                ), "TypeError")
+
+            return obj.numeric(linalg.matvec(left, right.data))
+
+        if type(left) == obj.Matrix and type(right) == obj.Number:
+            return linalg.scalar(fn, left, right.value)
+
+        if type(left) == obj.Number and type(right) == obj.Matrix and op != "/":
+            return linalg.scalar(fn, right, left.value, swap=True)
+    except ZeroDivisionError:
+        return err(ctx, "division by zero in %s %s %s" % (left.type, op, right.type), "GeneralError")
 
     return err(ctx, "unknown operator: %s %s %s" % (left.type, op, right.type), "NotFoundError")
 
 def eval_collection_infix(op, left, right, ctx):
-    l = left.get_elements()
-    r = right.get_elements()
+    if op == "+" and type(left) == obj.String and type(right) == obj.String:
+        return left.concat(right)
 
     if op == "==": return bool_obj(left == right)
     if op == "!=": return bool_obj(left != right)
 
-    if op == "+":  return type(left)(l + r)
-    if op == "-":  return type(left)([e for e in l if e not in r])
-    if op in "&&": return type(left)([e for e in l if e in r])
+    l = left.get_elements()
+    r = right.get_elements()
+
+    if op == "+":  return left.rebuild(l + r)
+    if op == "-":  return left.rebuild([e for e in l if e not in r])
+    if op in "&&": return left.rebuild([e for e in l if e in r])
 
     if op in "||":
         result = []
@@ -369,7 +515,7 @@ def eval_collection_infix(op, left, right, ctx):
             if elem not in result:
                 result.append(elem)
 
-        return type(left)(result)
+        return left.rebuild(result)
 
     return err(ctx, "unknown operator: %s %s %s" % (left.type, op, right.type), "NotFoundError")
 
@@ -419,7 +565,7 @@ def eval_function_call(node, ctx):
         if on_call_result != None or is_err(on_call_result):
             return on_call_result
 
-        result = evaluate(function.body, enclosed)
+        result = eval_body(function.body, enclosed)
         if is_err(result):
             return result
     else:
@@ -471,12 +617,15 @@ def eval_for_loop(node, ctx):
 
     items = None
     if isinstance(collection, obj.Collection):
-        items = collection.get_elements()
+        items = collection.iter()
 
     if items == None:
         return err(ctx, "cannot use a for loop over a collection of type %s" % collection.type, "TypeError")
 
     for item in items:
+        if is_err(item):
+            return item
+
         enclosed = ctx.enclose_with_args({
             var.value: item
         })
@@ -514,6 +663,9 @@ def eval_class_stmt(node, ctx):
             init_pattern = [node.name] + fn.pattern
             
             def on_init(self, args, ctx, enclosed):
+                if has_yield(self.body):
+                    return err(ctx, "an init method can't yield, since it gives back the new instance", "SyntaxError")
+
                 enclosed["self"] = obj.Instance(o)
                 
                 result = evaluate(self.body, enclosed)
@@ -582,7 +734,7 @@ def eval_method_call(node, ctx):
     
     enclosed = ctx.enclose_with_args(args)
     
-    return evaluate(function.fn.body, enclosed)
+    return eval_body(function.fn.body, enclosed)
 
 def eval_match_expr(node, ctx):
     val = evaluate(node.expr, ctx)
@@ -662,6 +814,166 @@ def eval_try_expr(node, ctx):
     else:
         return val
 
+# Nodes which can't contain a yield belonging to
+# the function or block they're in.
+yield_boundaries = [
+    ast.BlockLiteral,
+    ast.FunctionDefinition,
+    ast.InitDefinition,
+    ast.ClassStatement
+]
+
+yield_cache = weakref.WeakKeyDictionary()
+
+def has_yield(node):
+    """checks whether node contains a yield statement, not counting nested functions and blocks"""
+    if node in yield_cache:
+        return yield_cache[node]
+
+    found = False
+
+    if type(node) == ast.YieldStatement:
+        found = True
+    elif type(node) not in yield_boundaries:
+        found = any(has_yield(child) for child in ast_children(node))
+
+    yield_cache[node] = found
+
+    return found
+
+def ast_children(node):
+    stack = list(vars(node).values())
+
+    while len(stack) > 0:
+        item = stack.pop()
+
+        if isinstance(item, ast.Node):
+            yield item
+        elif type(item) in [list, tuple]:
+            stack.extend(item)
+        elif type(item) == dict:
+            stack.extend(item.keys())
+            stack.extend(item.values())
+
+def eval_body(body, ctx):
+    """evaluates the body of a function, method or block, which makes a generator if it contains a yield"""
+    if has_yield(body):
+        return obj.Generator(eval_gen(body, ctx))
+
+    return evaluate(body, ctx)
+
+def eval_gen(node, ctx):
+    """
+        evaluates node as the body of a generator. this
+        is a python generator, yielding each value given
+        to a yield statement and returning the result of
+        node in the same way evaluate() would
+    """
+    t = type(node)
+
+    if not has_yield(node):
+        return evaluate(node, ctx)
+
+    if t == ast.YieldStatement:
+        val = evaluate(node.value, ctx)
+        if is_err(val):
+            return val
+
+        yield val
+        return NULL
+
+    if t == ast.ExpressionStatement:
+        return (yield from eval_gen(node.expr, ctx))
+
+    if t == ast.BlockStatement:
+        result = NULL
+
+        for stmt in node.statements:
+            result = yield from eval_gen(stmt, ctx)
+
+            if is_err(result) or result != None and result.type in [obj.RETURN_VALUE, obj.NEXT, obj.BREAK]:
+                return result
+
+        return result
+
+    if t == ast.IfExpression:
+        condition = evaluate(node.condition, ctx)
+        if is_err(condition):
+            return condition
+
+        if is_truthy(condition):
+            return (yield from eval_gen(node.consequence, ctx))
+        elif node.alternative != None:
+            return (yield from eval_gen(node.alternative, ctx))
+
+        return NULL
+
+    if t == ast.WhileLoop:
+        while True:
+            condition = evaluate(node.condition, ctx)
+            if is_err(condition):
+                return condition
+
+            if not is_truthy(condition):
+                break
+
+            result = yield from eval_gen(node.body, ctx.enclose())
+            if is_err(result) or type(result) == obj.ReturnValue:
+                return result
+
+            if type(result) == obj.Break:
+                break
+
+        return NULL
+
+    if t == ast.ForLoop:
+        collection = evaluate(node.collection, ctx)
+        if is_err(collection):
+            return collection
+
+        if not isinstance(collection, obj.Collection):
+            return err(ctx, "cannot use a for loop over a collection of type %s" % collection.type, "TypeError")
+
+        for item in collection.iter():
+            if is_err(item):
+                return item
+
+            enclosed = ctx.enclose_with_args({
+                node.var.value: item
+            })
+
+            result = yield from eval_gen(node.body, enclosed)
+            if is_err(result) or type(result) == obj.ReturnValue:
+                return result
+
+            if type(result) == obj.Break:
+                break
+
+        return NULL
+
+    if t == ast.MatchExpression:
+        val = evaluate(node.expr, ctx)
+        if is_err(val):
+            return val
+
+        for exprs, result in node.arms:
+            m = exprs == None
+
+            for expr in exprs or []:
+                e = evaluate(expr, ctx)
+                if is_err(e):
+                    return e
+
+                if e == val:
+                    m = True
+
+            if m:
+                return (yield from eval_gen(result, ctx.enclose()))
+
+        return NULL
+
+    return err(ctx, "yield cannot be used inside %s" % node.token.literal, "SyntaxError")
+
 def unwrap_return_value(o):
     if type(o) == obj.ReturnValue:
         return o.value
@@ -669,12 +981,14 @@ def unwrap_return_value(o):
     return o
 
 def is_truthy(o):
-    return not (
-        o == NULL or
-        o == FALSE or
-        type(o) == obj.Number and o.value == 0 or
-        isinstance(o, obj.Collection) and len(o.get_elements()) == 0
-    )
+    t = type(o)
+
+    if t == obj.Boolean:               return o.value
+    if t == obj.Null:                  return False
+    if t == obj.Number:                return o.value != 0
+    if isinstance(o, obj.Collection):  return not o.is_empty()
+
+    return True
 
 def bool_obj(o):
     return TRUE if o else FALSE
@@ -0,0 +1,76 @@
+import operator
+
+import obj
+
+class SingularMatrix(Exception):
+    """raised by solve when the system has no unique solution"""
+    pass
+
+
+def matmul(a, b):
+    """the matrix product of a and b, which must have compatible shapes"""
+    rows = a.row_lists()
+    cols = b.column_lists()
+    mul = operator.mul
+
+    values = [sum(map(mul, row, col)) for row in rows for col in cols]
+
+    return obj.matrix(a.rows, b.cols, values)
+
+def matvec(a, v):
+    """the product of the matrix a and the sequence of numbers v"""
+    mul = operator.mul
+    return [sum(map(mul, row, v)) for row in a.row_lists()]
+
+def elementwise(fn, a, b):
+    """applies fn to each pair of elements of matrices a and b"""
+    return obj.matrix(a.rows, a.cols, list(map(fn, a.values(), b.values())))
+
+def scalar(fn, a, n, swap=False):
+    """applies fn to each element of a and the number n"""
+    if swap:
+        values = [fn(n, v) for v in a.values()]
+    else:
+        values = [fn(v, n) for v in a.values()]
+
+    return obj.matrix(a.rows, a.cols, values)
+
+def solve(a, b):
+    """
+        solves a x = b for x, by gaussian elimination with
+        partial pivoting. a is a square matrix and b a list
+        of rows, each of which has as many columns as the
+        result. the rows of x are returned
+    """
+    n = a.rows
+    m = [row + b[i] for i, row in enumerate(a.row_lists())]
+    width = len(m[0]) if n > 0 else 0
+
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+
+        if m[pivot][col] == 0:
+            raise SingularMatrix()
+
+        m[col], m[pivot] = m[pivot], m[col]
+        top = m[col]
+        p = top[col]
+
+        for r in range(col + 1, n):
+            row = m[r]
+            factor = row[col] / p
+
+            if factor != 0:
+                for k in range(col, width):
+                    row[k] -= factor * top[k]
+
+    x = [None] * n
+
+    for r in range(n - 1, -1, -1):
+        row = m[r]
+        x[r] = [
+            (row[n + k] - sum(row[j] * x[j][k] for j in range(r + 1, n))) / row[r]
+            for k in range(width - n)
+        ]
+
+    return x
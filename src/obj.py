@@ -1,5 +1,9 @@
 import ast
+import array
+import heapq
+import bisect
 import evaluator
+import collections
 
 # Types which the user should never directly see
 RETURN_VALUE = "<!return value>"
@@ -18,6 +22,18 @@ NULL     = "<null>"
 BLOCK    = "<block>"
 TUPLE    = "<tuple>"
 MAP      = "<map>"
+BUILDER  = "<string builder>"
+RANGE    = "<range>"
+STREAM   = "<stream>"
+GENERATOR = "<generator>"
+NUMARRAY = "<numeric array>"
+MATRIX   = "<matrix>"
+HEAP     = "<heap>"
+SORTED   = "<sorted list>"
+DEQUE    = "<deque>"
+FILE     = "<file>"
+BYTES    = "<bytes>"
+REGEX    = "<regex>"
 CLASS    = "<class>"
 INIT     = "<init method>"
 METH     = "<method>"
@@ -28,7 +44,7 @@ class InternalObject(object):
         return type(other) == type(self)
 
     def __ne__(self, other):
-        return not self.__eq__(other)
+        return not self == other
 
     def __str__(self):
         return ""
@@ -37,18 +53,64 @@ class InternalObject(object):
         return self.__str__()
 
 
+def compare(prop = "value"):
+    # NotImplemented lets python try the other side's __eq__,
+    # so a collection of another kind can compare element-wise
+    return (lambda self, other: getattr(self, prop) == getattr(other, prop) if type(self) == type(other) else NotImplemented)
+
+def hasher():
+    return (lambda self: hash(repr(self)))
+
+
 class Collection(InternalObject):
     t = "<any collection>"
-    
+
+    # Listlike collections keep their elements in order and can be
+    # iterated more than once. Two of them are equal if they hold
+    # equal elements, even if they're of different kinds.
+    listlike = False
+
+    def __eq__(self, other):
+        if not (self.listlike and isinstance(other, Collection) and other.listlike):
+            return False
+
+        return self.length() == other.length() and all(a == b for a, b in zip(self.iter(), other.iter()))
+
+    def __hash__(self):
+        # equal listlike collections hold equal elements, so
+        # they hash the same whatever kind they are
+        if self.listlike:
+            return hash(tuple(self.iter()))
+
+        return hash(repr(self))
+
     def get_elements(self):
         return []
 
+    def length(self):
+        return len(self.get_elements())
 
-def compare(prop = "value"):
-    return (lambda self, other: getattr(self, prop) == getattr(other, prop) if type(self) == type(other) else False)
+    def at(self, i):
+        return self.get_elements()[i]
 
-def hasher():
-    return (lambda self: hash(repr(self)))
+    def iter(self):
+        return iter(self.get_elements())
+
+    def reverse_iter(self):
+        return reversed(self.get_elements())
+
+    def is_empty(self):
+        return self.length() == 0
+
+    def contains(self, item):
+        return any(e == item for e in self.iter())
+
+    def slice(self, start, stop):
+        return self.rebuild(self.get_elements()[start:stop])
+
+    def rebuild(self, elements):
+        """returns a collection of the same kind, holding elements"""
+        return type(self)(elements)
 
 
 class ReturnValue(InternalObject):
@@ -68,24 +130,43 @@ class ReturnValue(InternalObject):
 class Number(InternalObject):
     t = NUMBER
     
-    """represents a number object"""
+    """
+        represents a number object. the value is either
+        a python int, for exact arbitrary-precision
+        integers, or a float
+    """
     def __init__(self, value):
         self.type = NUMBER
-        self.value = float(value)
+        self.value = value if type(value) == int else float(value)
 
     __eq__ = compare()
-    __hash__ = hasher()
+
+    def __hash__(self):
+        # hash(1) == hash(1.0), so equal numbers hash equally
+        return hash(self.value)
 
     def __str__(self):
         return str(self.value)
 
     def is_integer(self):
-        return float(int(self.value)) == self.value
+        return type(self.value) == int or self.value.is_integer()
 
     def is_positive(self):
         return self.value >= 0
 
 
+# Small ints are interned, since they're produced
+# constantly by counting loops and index arithmetic.
+small_ints = [Number(i) for i in range(-128, 1025)]
+
+def number(value):
+    """returns a Number for value, shared if possible"""
+    if type(value) == int and -128 <= value <= 1024:
+        return small_ints[value + 128]
+
+    return Number(value)
+
+
 class Boolean(InternalObject):
     t = BOOLEAN
     
@@ -101,17 +182,110 @@ class Boolean(InternalObject):
         return str(self.value).lower()
 
 
+# Strings longer than this are concatenated into
+# a rope instead of being copied.
+ROPE_THRESHOLD = 512
+
+# Adjacent rope leaves are merged up to this size.
+ROPE_LEAF = 256
+
+# A rope deeper than this is rebalanced.
+MAX_ROPE_DEPTH = 48
+
+class Rope(object):
+    """a concatenation node of a string's rope. each side is a str or a Rope"""
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.length = len(left) + len(right)
+        self.depth = max(
+            left.depth if type(left) == Rope else 0,
+            right.depth if type(right) == Rope else 0
+        ) + 1
+
+    def __len__(self):
+        return self.length
+
+    def leaves(self):
+        leaves = []
+        stack = [self]
+
+        while len(stack) > 0:
+            node = stack.pop()
+
+            if type(node) == Rope:
+                stack.append(node.right)
+                stack.append(node.left)
+            else:
+                leaves.append(node)
+
+        return leaves
+
+    def flatten(self):
+        return "".join(self.leaves())
+
+    def rebalance(self):
+        nodes = self.leaves()
+
+        while len(nodes) > 1:
+            paired = [Rope(nodes[i], nodes[i + 1]) for i in range(0, len(nodes) - 1, 2)]
+
+            if len(nodes) % 2 == 1:
+                paired.append(nodes[-1])
+
+            nodes = paired
+
+        return nodes[0]
+
+
+def rope_concat(left, right):
+    """joins two strs or Ropes, keeping the result shallow"""
+    if type(left) == Rope and type(right) == str and type(left.right) == str and len(left.right) + len(right) <= ROPE_LEAF:
+        return Rope(left.left, left.right + right)
+
+    rope = Rope(left, right)
+
+    if rope.depth > MAX_ROPE_DEPTH:
+        return rope.rebalance()
+
+    return rope
+
+
 class String(Collection):
     t = STRING
     
-    """a string object"""
-    def __init__(self, value):
+    """
+        a string object. slices of a string are views
+        onto the parent's buffer, which is only copied
+        once the actual value is needed. long strings
+        built by concatenation are stored as a Rope,
+        which is flattened when it's indexed or printed
+    """
+    def __init__(self, value, start = 0, stop = None):
         self.type = STRING
 
         if type(value) == list:
-            self.value = "".join(str(e) if type(e) != Char else str(e.value) for e in value)
-        else:
-            self.value = value
+            value = "".join([e.value if type(e) == Char else str(e) for e in value])
+
+        self.buffer = value
+        self.start = start
+        self.stop = len(value) if stop == None else stop
+
+    def flat_buffer(self):
+        if type(self.buffer) == Rope:
+            self.buffer = self.buffer.flatten()
+
+        return self.buffer
+
+    @property
+    def value(self):
+        self.flat_buffer()
+
+        if self.start != 0 or self.stop != len(self.buffer):
+            self.buffer = self.buffer[self.start:self.stop]
+            self.start, self.stop = 0, len(self.buffer)
+
+        return self.buffer
 
     __eq__ = compare()
     __hash__ = hasher()
@@ -120,7 +294,45 @@ class String(Collection):
         return self.value
 
     def get_elements(self):
-        return [Char(ch) for ch in list(self.value)]
+        return list(self.iter())
+
+    def length(self):
+        return self.stop - self.start
+
+    def at(self, i):
+        return char(self.flat_buffer()[self.start + i])
+
+    def iter(self):
+        buffer = self.flat_buffer()
+        return (char(buffer[i]) for i in range(self.start, self.stop))
+
+    def reverse_iter(self):
+        buffer = self.flat_buffer()
+        return (char(buffer[i]) for i in range(self.stop - 1, self.start - 1, -1))
+
+    def slice(self, start, stop):
+        self.flat_buffer()
+
+        start = self.start + min(start, self.length())
+        stop = max(start, self.start + min(stop, self.length()))
+
+        return String(self.buffer, start, stop)
+
+    def piece(self):
+        """returns the contents as a str or a Rope, without flattening"""
+        if type(self.buffer) == Rope:
+            return self.buffer
+
+        return self.value
+
+    def concat(self, other):
+        """other is either a String or a str"""
+        right = other.piece() if type(other) == String else other
+
+        if self.length() + len(right) < ROPE_THRESHOLD:
+            return String(self.value + (right if type(right) == str else right.flatten()))
+
+        return String(rope_concat(self.piece(), right))
 
 
 class Char(InternalObject):
@@ -138,22 +350,255 @@ class Char(InternalObject):
         return "'%s'" % self.value
 
 
-class Tuple(Collection):
+# Chars in the Latin-1 range are interned, since
+# they're created whenever a string is iterated.
+latin1_chars = [Char(chr(i)) for i in range(256)]
+
+def char(ch):
+    """returns a Char for ch, shared if possible"""
+    if ord(ch) < 256:
+        return latin1_chars[ord(ch)]
+
+    return Char(ch)
+
+
+class StringBuilder(InternalObject):
+    t = BUILDER
+
+    """accumulates pieces of a string, to be joined once at the end"""
+    def __init__(self):
+        self.type = BUILDER
+        self.parts = []
+
+    def __str__(self):
+        return self.build()
+
+    def write(self, o):
+        self.parts.append(o.value if type(o) in [String, Char] else str(o))
+
+    def build(self):
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+
+        return self.parts[0] if len(self.parts) > 0 else ""
+
+
+class Bytes(Collection):
+    t = BYTES
+    listlike = True
+
+    """
+        an immutable sequence of bytes, whose elements are
+        numbers. source is a bytes object or a read-only mmap,
+        and the bytes are source[start:stop], so slices are
+        views which share their parent's source
+    """
+    def __init__(self, source, start = 0, stop = None):
+        self.type = BYTES
+        self.source = source
+        self.start = start
+        self.stop = len(source) if stop == None else stop
+
+    def __eq__(self, other):
+        if type(other) == Bytes:
+            return self.view() == other.view()
+
+        return Collection.__eq__(self, other)
+
+    __hash__ = Collection.__hash__
+
+    def __str__(self):
+        return str(bytes(self.view()))
+
+    def view(self):
+        return memoryview(self.source)[self.start:self.stop]
+
+    def get_elements(self):
+        return list(self.iter())
+
+    def length(self):
+        return self.stop - self.start
+
+    def at(self, i):
+        return number(self.source[self.start + i])
+
+    def iter(self):
+        return map(number, self.view())
+
+    def reverse_iter(self):
+        return map(number, reversed(self.view()))
+
+    def find(self, needle):
+        """the index of the bytes needle, or -1 if they aren't there"""
+        i = self.source.find(needle, self.start, self.stop)
+        return i if i == -1 else i - self.start
+
+    def contains(self, item):
+        if type(item) == Bytes:
+            return self.find(item.view()) != -1
+
+        if type(item) == Number and item.value in range(256):
+            return self.find(bytes([int(item.value)])) != -1
+
+        return False
+
+    def slice(self, start, stop):
+        start = self.start + min(start, self.length())
+        stop = max(start, self.start + min(stop, self.length()))
+
+        return Bytes(self.source, start, stop)
+
+    def rebuild(self, elements):
+        if all(type(e) == Number and e.value in range(256) for e in elements):
+            return Bytes(bytes(int(e.value) for e in elements))
+
+        return Array(elements)
+
+    def decode(self, encoding):
+        return str(self.view(), encoding)
+
+
+class Regex(InternalObject):
+    t = REGEX
+
+    """a compiled regular expression, along with the flags it was compiled with"""
+    def __init__(self, compiled, flags):
+        self.type = REGEX
+        self.compiled = compiled
+        self.flags = flags
+
+    def __eq__(self, other):
+        return type(other) == Regex and self.compiled == other.compiled
+
+    __hash__ = hasher()
+
+    def __str__(self):
+        return "/%s/%s" % (self.compiled.pattern, self.flags)
+
+
+# Files are read and written through buffers of this size
+FILE_BUFFER = 1 << 20
+
+def lines(handle):
+    """yields the lines of a binary file as python strings, without their newlines"""
+    for line in handle:
+        if line.endswith(b"\n"):
+            line = line[:-2] if line.endswith(b"\r\n") else line[:-1]
+
+        yield line.decode("utf-8")
+
+
+class File(InternalObject):
+    t = FILE
+
+    """
+        an open file. the handle is a binary python file with
+        a large buffer, and text goes through it as utf-8
+    """
+    def __init__(self, path, mode):
+        self.type = FILE
+        self.path = path
+        self.mode = mode
+        self.handle = open(path, mode + "b", buffering=FILE_BUFFER)
+
+    def __eq__(self, other):
+        return self is other
+
+    __hash__ = hasher()
+
+    def __str__(self):
+        return "<file %s>" % self.path
+
+    def is_closed(self):
+        return self.handle.closed
+
+    def is_readable(self):
+        return self.mode == "r"
+
+    def lines(self):
+        return lines(self.handle)
+
+    def read(self, n = -1):
+        return self.handle.read(n)
+
+    def write(self, o):
+        if type(o) == Bytes:
+            self.handle.write(o.view())
+            return
+
+        text = o.value if type(o) in [String, Char] else str(o)
+        self.handle.write(text.encode("utf-8"))
+
+    def close(self):
+        self.handle.close()
+
+
+class Sequence(Collection):
+    """
+        a collection backed by a python list, which is never
+        mutated in place. slices are views onto their parent's
+        list. a stop of None means the view runs to the end of
+        the list
+    """
+    def __init__(self, items, start = 0, stop = None):
+        self.items = items if type(items) == list else list(items)
+        self.start = start
+        self.stop = stop
+
+    def is_view(self):
+        return self.start != 0 or self.stop != None
+
+    def window(self):
+        if self.is_view():
+            self.items = self.items[self.start:self.stop]
+            self.start, self.stop = 0, None
+
+        return self.items
+
+    def get_elements(self):
+        return self.window()
+
+    def length(self):
+        return (len(self.items) if self.stop == None else self.stop) - self.start
+
+    def at(self, i):
+        return self.items[self.start + i]
+
+    def iter(self):
+        if not self.is_view():
+            return iter(self.items)
+
+        items = self.items
+        return (items[i] for i in range(self.start, self.stop))
+
+    def reverse_iter(self):
+        items = self.items
+        return (items[i] for i in range(self.start + self.length() - 1, self.start - 1, -1))
+
+    def slice(self, start, stop):
+        start = self.start + min(start, self.length())
+        stop = max(start, self.start + min(stop, self.length()))
+
+        return type(self)(self.items, start, stop)
+
+
+class Tuple(Sequence):
     t = TUPLE
     
     """a tuple object"""
-    def __init__(self, value):
+    def __init__(self, value, start = 0, stop = None):
         self.type = TUPLE
-        self.value = value
+        Sequence.__init__(self, value, start, stop)
+
+    @property
+    def value(self):
+        return self.window()
 
     __eq__ = compare()
     __hash__ = hasher()
 
     def __str__(self):
-        return "(%s)" % "".join(str(e) + ", " for e in self.value)[:-2]
-
-    def get_elements(self):
-        return self.value
+        return "(%s)" % "".join(str(e) + ", " for e in self.iter())[:-2]
 
 
 class Map(InternalObject):
@@ -193,22 +638,479 @@ class Null(InternalObject):
         return "null"
 
 
-class Array(Collection):
+class Array(Sequence):
     t = ARRAY
+    listlike = True
     
     """an array object"""
-    def __init__(self, elements):
+    def __init__(self, elements, start = 0, stop = None):
         self.type = ARRAY
-        self.elements = elements
+        Sequence.__init__(self, elements, start, stop)
+
+    @property
+    def elements(self):
+        return self.window()
 
     __eq__ = compare("elements")
+    __hash__ = Collection.__hash__
+
+    def __str__(self):
+        return "[%s]" % "".join(str(e) + ", " for e in self.iter())[:-2]
+
+
+class Range(Collection):
+    t = RANGE
+    listlike = True
+    
+    """
+        a lazy range of integers, backed by a python
+        range, so it takes constant memory however
+        many numbers it covers
+    """
+    def __init__(self, numbers):
+        self.type = RANGE
+        self.range = numbers
+
+    def __eq__(self, other):
+        if type(other) == Range:
+            return self.range == other.range
+
+        return Collection.__eq__(self, other)
+
+    __hash__ = Collection.__hash__
+
+    def __str__(self):
+        return "[%s]" % "".join(str(i) + ", " for i in self.range)[:-2]
+
+    def get_elements(self):
+        return list(self.iter())
+
+    def length(self):
+        return len(self.range)
+
+    def at(self, i):
+        return number(self.range[i])
+
+    def iter(self):
+        return map(number, self.range)
+
+    def reverse_iter(self):
+        return map(number, reversed(self.range))
+
+    def contains(self, item):
+        return type(item) == Number and item.is_integer() and int(item.value) in self.range
+
+    def slice(self, start, stop):
+        return Range(self.range[start:stop])
+
+    def rebuild(self, elements):
+        return Array(elements)
+
+
+class NumArray(Collection):
+    t = NUMARRAY
+    listlike = True
+    
+    """
+        a homogeneous array of numbers, stored unboxed in a
+        contiguous buffer of int64s or float64s
+    """
+    def __init__(self, data):
+        self.type = NUMARRAY
+        self.data = data
+
+    def __eq__(self, other):
+        if type(other) == NumArray:
+            return self.data == other.data
+
+        return Collection.__eq__(self, other)
+
+    __hash__ = Collection.__hash__
+
+    def __str__(self):
+        return "[%s]" % "".join(str(n) + ", " for n in self.data)[:-2]
+
+    def get_elements(self):
+        return list(self.iter())
+
+    def length(self):
+        return len(self.data)
+
+    def at(self, i):
+        return number(self.data[i])
+
+    def iter(self):
+        return map(number, self.data)
+
+    def reverse_iter(self):
+        return map(number, reversed(self.data))
+
+    def contains(self, item):
+        return type(item) == Number and item.value in self.data
+
+    def slice(self, start, stop):
+        return NumArray(self.data[start:stop])
+
+    def rebuild(self, elements):
+        if all(type(e) == Number for e in elements):
+            try:
+                return numeric([e.value for e in elements])
+            except OverflowError:
+                pass
+
+        return Array(elements)
+
+
+def numeric(values):
+    """
+        makes a NumArray from python numbers, using int64s
+        if they're all integers, or float64s otherwise.
+        raises OverflowError if one of them doesn't fit,
+        rather than losing precision
+    """
+    values = values if type(values) == list else list(values)
+    typecode = "q" if all(type(v) == int for v in values) else "d"
+
+    return NumArray(array.array(typecode, values))
+
+
+class Matrix(InternalObject):
+    t = MATRIX
+
+    """
+        a dense 2d matrix of float64s. the elements live in a
+        flat buffer, and (i, j) is found at
+        offset + i * row_stride + j * col_stride, so rows,
+        columns and transposes are views sharing the buffer
+    """
+    def __init__(self, data, rows, cols, offset=0, row_stride=None, col_stride=1):
+        self.type = MATRIX
+        self.data = data
+        self.rows = rows
+        self.cols = cols
+        self.offset = offset
+        self.row_stride = cols if row_stride == None else row_stride
+        self.col_stride = col_stride
+
+    def __eq__(self, other):
+        return (type(other) == Matrix and
+                self.rows == other.rows and self.cols == other.cols and
+                self.row_lists() == other.row_lists())
+
     __hash__ = hasher()
 
     def __str__(self):
-        return "[%s]" % "".join(str(e) + ", " for e in self.elements)[:-2]
+        return "[%s]" % ", ".join(
+            "[%s]" % ", ".join(str(number(v)) for v in row)
+            for row in self.row_lists()
+        )
+
+    def is_contiguous(self):
+        return self.col_stride == 1 and self.row_stride == self.cols
+
+    def get(self, i, j):
+        return self.data[self.offset + i * self.row_stride + j * self.col_stride]
+
+    def row(self, i):
+        """a python sequence of the values in the ith row"""
+        start = self.offset + i * self.row_stride
+        return self.data[start:start + self.cols * self.col_stride:self.col_stride] if self.cols > 0 else []
+
+    def column(self, j):
+        """a python sequence of the values in the jth column"""
+        start = self.offset + j * self.col_stride
+        return self.data[start:start + self.rows * self.row_stride:self.row_stride] if self.rows > 0 else []
+
+    def row_lists(self):
+        return [list(self.row(i)) for i in range(self.rows)]
+
+    def column_lists(self):
+        return [list(self.column(j)) for j in range(self.cols)]
+
+    def row_view(self, i):
+        return Matrix(self.data, 1, self.cols, self.offset + i * self.row_stride, self.row_stride, self.col_stride)
+
+    def column_view(self, j):
+        return Matrix(self.data, self.rows, 1, self.offset + j * self.col_stride, self.row_stride, self.col_stride)
+
+    def transpose(self):
+        return Matrix(self.data, self.cols, self.rows, self.offset, self.col_stride, self.row_stride)
+
+    def values(self):
+        """the elements in row-major order, as a flat python sequence"""
+        if self.is_contiguous():
+            return self.data[self.offset:self.offset + self.rows * self.cols]
+
+        return [v for i in range(self.rows) for v in self.row(i)]
+
+
+def matrix(rows, cols, values):
+    """makes a contiguous Matrix from python numbers in row-major order"""
+    return Matrix(array.array("d", values), rows, cols)
+
+
+class SortError(Exception):
+    """carries an error value out of a comparison"""
+    def __init__(self, error):
+        self.error = error
+
+
+class Heap(Collection):
+    t = HEAP
+
+    """
+        a priority queue. entries are (key, n, value) tuples,
+        kept in heap order, where n breaks ties so that equal
+        keys come out in the order they went in. iterating
+        over a heap gives its values from smallest to largest,
+        which are kept in order until the heap changes
+    """
+    def __init__(self, entries = None):
+        self.type = HEAP
+        self.entries = entries if entries != None else []
+        self.count = len(self.entries)
+        self.ordered = None
+        heapq.heapify(self.entries)
+
+    def __eq__(self, other):
+        return self is other
+
+    __hash__ = hasher()
+
+    def __str__(self):
+        return "heap [%s]" % ", ".join(str(v) for v in self.iter())
+
+    def get_elements(self):
+        """
+            the values from smallest to largest. if two keys
+            can't be compared, the error is the only element
+        """
+        if self.ordered == None:
+            try:
+                self.ordered = [entry[2] for entry in sorted(self.entries)]
+            except SortError as e:
+                return [e.error]
+
+        return list(self.ordered)
+
+    def length(self):
+        return len(self.entries)
+
+    def push(self, key, value):
+        heapq.heappush(self.entries, (key, self.count, value))
+        self.count += 1
+        self.ordered = None
+
+    def pop(self):
+        self.ordered = None
+        return heapq.heappop(self.entries)[2]
+
+    def peek(self):
+        return self.entries[0][2]
+
+    def rebuild(self, elements):
+        return Array(elements)
+
+
+class SortedList(Collection):
+    t = SORTED
+    listlike = True
+
+    """
+        a list which is kept in order as items are inserted.
+        keys holds the key each item is ordered by, so the
+        position of a new item is found by binary search.
+        the list starts at keys[start] and items[start], so
+        popping the smallest item just moves start along
+    """
+    def __init__(self, keys = None, items = None):
+        self.type = SORTED
+        self.keys = keys if keys != None else []
+        self.items = items if items != None else []
+        self.start = 0
+
+    def __str__(self):
+        return "sorted [%s]" % ", ".join(str(v) for v in self.iter())
 
     def get_elements(self):
-        return self.elements
+        return self.items[self.start:]
+
+    def length(self):
+        return len(self.items) - self.start
+
+    def at(self, i):
+        return self.items[self.start + i]
+
+    def iter(self):
+        # iterate over a snapshot, so a loop can insert into or pop from the list
+        return iter(self.get_elements())
+
+    def reverse_iter(self):
+        return reversed(self.get_elements())
+
+    def bisect(self, key):
+        """the index at which an item with key would be inserted, before any equal ones"""
+        return bisect.bisect_left(self.keys, key, self.start) - self.start
+
+    def insert(self, key, value):
+        i = bisect.bisect_right(self.keys, key, self.start)
+        self.keys.insert(i, key)
+        self.items.insert(i, value)
+
+    def pop(self):
+        value = self.items[self.start]
+        self.keys[self.start] = self.items[self.start] = None
+        self.start += 1
+
+        # drop the popped slots once they're half of the list,
+        # so each pop is O(1) on average
+        if self.start * 2 >= len(self.items):
+            del self.keys[:self.start]
+            del self.items[:self.start]
+            self.start = 0
+
+        return value
+
+    def peek(self):
+        return self.items[self.start]
+
+    def slice(self, start, stop):
+        start, stop = self.start + min(start, self.length()), self.start + min(stop, self.length())
+        return SortedList(self.keys[start:stop], self.items[start:stop])
+
+    def rebuild(self, elements):
+        return Array(elements)
+
+
+class Deque(Collection):
+    t = DEQUE
+    listlike = True
+
+    """
+        a double-ended queue, which can be pushed to and
+        popped from at either end in O(1). if it has a
+        capacity, pushing onto a full deque drops an item
+        from the other end
+    """
+    def __init__(self, items = (), capacity = None):
+        self.type = DEQUE
+        self.items = collections.deque(items, capacity)
+
+    def __str__(self):
+        return "deque [%s]" % ", ".join(str(v) for v in self.items)
+
+    def get_elements(self):
+        return list(self.items)
+
+    def length(self):
+        return len(self.items)
+
+    def at(self, i):
+        return self.items[i]
+
+    def iter(self):
+        # iterate over a snapshot, so a loop can push to the deque
+        return iter(list(self.items))
+
+    def reverse_iter(self):
+        return reversed(list(self.items))
+
+    def contains(self, item):
+        return item in self.items
+
+    def rebuild(self, elements):
+        return Deque(elements, self.items.maxlen)
+
+
+class Stream(Collection):
+    t = STREAM
+    
+    """
+        a lazy collection over a python iterator. like
+        a python generator, it can only be iterated once.
+        items which have been looked at but not consumed
+        yet are kept in a buffer
+    """
+    def __init__(self, items):
+        self.type = STREAM
+        self.items = items
+        self.buffer = collections.deque()
+        self.done = False
+
+    def __eq__(self, other):
+        return self is other
+
+    __hash__ = object.__hash__
+
+    def __str__(self):
+        return "[%s]" % "".join(str(e) + ", " for e in self.get_elements())[:-2]
+
+    def pull(self):
+        """fetches the next item into the buffer, returning False once there are none left"""
+        if self.done:
+            return False
+
+        try:
+            self.buffer.append(next(self.items))
+        except StopIteration:
+            self.done = True
+            return False
+
+        return True
+
+    def get_elements(self):
+        while self.pull():
+            pass
+
+        return list(self.buffer)
+
+    def is_empty(self):
+        return len(self.buffer) == 0 and not self.pull()
+
+    def at(self, i):
+        while len(self.buffer) <= i and self.pull():
+            pass
+
+        return self.buffer[i]
+
+    def iter(self):
+        while len(self.buffer) > 0 or self.pull():
+            yield self.buffer.popleft()
+
+    def rebuild(self, elements):
+        return Array(elements)
+
+
+class Generator(Stream):
+    t = GENERATOR
+    
+    """
+        the result of calling a function or block which
+        contains a yield statement. an error raised by the
+        body is produced as its last item
+    """
+    def __init__(self, gen):
+        Stream.__init__(self, gen)
+        self.type = GENERATOR
+
+    def __str__(self):
+        return "<generator instance>"
+
+    def pull(self):
+        if self.done:
+            return False
+
+        try:
+            self.buffer.append(next(self.items))
+        except StopIteration as stop:
+            self.done = True
+
+            if evaluator.is_err(stop.value):
+                self.buffer.append(stop.value)
+            else:
+                return False
+
+        return True
 
 
 class Function(InternalObject):
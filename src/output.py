@@ -0,0 +1,142 @@
+import os
+import sys
+
+import obj
+
+# If set (by --unbuffered, or python's own PYTHONUNBUFFERED),
+# everything written is flushed straight away.
+unbuffered = bool(os.environ.get("PYTHONUNBUFFERED"))
+
+# The buffer is flushed once it holds this many characters.
+buffer_size = 1 << 16
+
+
+class Output(object):
+    """
+        buffers text on its way to a stream. the buffer is
+        flushed when it fills up, or after every line if the
+        stream is a terminal
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.parts = []
+        self.size = 0
+        self.line_buffered = stream.isatty()
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+
+        if unbuffered or self.size >= buffer_size or self.line_buffered and "\n" in text:
+            self.flush()
+
+    def flush(self):
+        if len(self.parts) > 0:
+            self.stream.write("".join(self.parts))
+            self.parts = []
+            self.size = 0
+
+        self.stream.flush()
+
+
+stdout = Output(sys.stdout)
+
+def write(text):
+    stdout.write(text)
+
+def flush():
+    stdout.flush()
+
+# The collections whose elements are written one at a time,
+# and the text written before and after them.
+brackets = {
+    obj.Array:      ("[", "]"),
+    obj.Tuple:      ("(", ")"),
+    obj.Stream:     ("[", "]"),
+    obj.Heap:       ("heap [", "]"),
+    obj.SortedList: ("sorted [", "]"),
+    obj.Deque:      ("deque [", "]")
+}
+
+def write_obj(o, out = None):
+    """
+        writes the string form of o, to stdout by default.
+        collections are written an element at a time, so a
+        large one is never built up as a single string
+    """
+    if out == None:
+        out = stdout
+
+    t = type(o)
+
+    if t in brackets:
+        opening, closing = brackets[t]
+        out.write(opening)
+
+        # a stream is printed without being used up
+        write_items(iter(o.get_elements()) if t == obj.Stream else o.iter(), out)
+        out.write(closing)
+    elif t == obj.Map:
+        if len(o.pairs) == 0:
+            out.write("[:]")
+            return
+
+        out.write("[")
+        first = True
+
+        for key, value in o.pairs.items():
+            if not first:
+                out.write(", ")
+
+            first = False
+            write_obj(key, out)
+            out.write(": ")
+            write_obj(value, out)
+
+        out.write("]")
+    elif t == obj.NumArray or t == obj.Range:
+        numbers = o.data if t == obj.NumArray else o.range
+        out.write("[")
+
+        for i in range(0, len(numbers), 1024):
+            if i > 0:
+                out.write(", ")
+
+            out.write(", ".join(map(str, numbers[i:i + 1024])))
+
+        out.write("]")
+    elif t == obj.Bytes:
+        write_bytes(o, out)
+    else:
+        out.write(str(o))
+
+def write_items(items, out):
+    first = True
+
+    for item in items:
+        if not first:
+            out.write(", ")
+
+        first = False
+        write_obj(item, out)
+
+def byte_escapes(quote):
+    """the text each byte is written as, in a bytes literal quoted by quote"""
+    special = {ord("\\"): "\\\\", ord(quote): "\\" + quote, ord("\t"): "\\t", ord("\n"): "\\n", ord("\r"): "\\r"}
+    return [special.get(b, chr(b) if 32 <= b < 127 else "\\x%02x" % b) for b in range(256)]
+
+escapes = {quote: byte_escapes(quote) for quote in "'\""}
+
+def write_bytes(o, out):
+    """writes o as python writes a bytes literal, a chunk at a time"""
+    has_single = o.source.find(b"'", o.start, o.stop) != -1
+    has_double = o.source.find(b'"', o.start, o.stop) != -1
+    quote = '"' if has_single and not has_double else "'"
+    table = escapes[quote]
+
+    out.write("b" + quote)
+
+    for i in range(o.start, o.stop, 1 << 16):
+        out.write("".join(map(table.__getitem__, o.source[i:min(i + (1 << 16), o.stop)])))
+
+    out.write(quote)
@@ -205,6 +205,8 @@ class Parser(object):
             stmt = self.parse_return_stmt()
         elif self.cur_is(token.DEF):
             stmt = self.parse_def_stmt()
+        elif self.cur_is(token.YIELD):
+            stmt = self.parse_yield_stmt()
         elif self.cur_is(token.NEXT):
             stmt = self.parse_next_stmt()
         elif self.cur_is(token.BREAK):
@@ -247,6 +249,13 @@ class Parser(object):
 
         return stmt
 
+    def parse_yield_stmt(self):
+        stmt = ast.YieldStatement(self.cur_tok, None)
+        self.next()
+        stmt.value = self.parse_expr(LOWEST)
+
+        return stmt
+
     def parse_next_stmt(self):
         return ast.NextStatement(self.cur_tok)
 
@@ -284,7 +293,10 @@ class Parser(object):
         lit = ast.Number(self.cur_tok, None)
 
         try:
-            lit.value = float(self.cur_tok.literal)
+            if "." in self.cur_tok.literal:
+                lit.value = float(self.cur_tok.literal)
+            else:
+                lit.value = int(self.cur_tok.literal)
         except ValueError:
             msg = "could not parse %s as a number" % self.cur_tok.literal
             self.err(msg)
@@ -0,0 +1,64 @@
+import re
+import collections
+
+# Maps the letters which can be given as flags to a regex
+# to the flags they stand for.
+flag_letters = {
+    "i": re.IGNORECASE,
+    "m": re.MULTILINE,
+    "s": re.DOTALL,
+    "x": re.VERBOSE,
+    "a": re.ASCII
+}
+
+class RegexCache(object):
+    """
+        a bounded cache of compiled patterns, keyed by the
+        pattern and its flags. when it's full, the least
+        recently used pattern is dropped
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.patterns = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def compile(self, pattern, flags = ""):
+        """returns the compiled pattern, raising ValueError for unknown flags or re.error if it's invalid"""
+        key = (pattern, flags)
+        compiled = self.patterns.get(key)
+
+        if compiled != None:
+            self.hits += 1
+            self.patterns.move_to_end(key)
+            return compiled
+
+        self.misses += 1
+        compiled = re.compile(pattern, parse_flags(flags))
+        self.patterns[key] = compiled
+
+        if len(self.patterns) > self.capacity:
+            self.patterns.popitem(last=False)
+            self.evictions += 1
+
+        return compiled
+
+    def clear(self):
+        self.patterns.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+def parse_flags(flags):
+    result = 0
+
+    for letter in flags:
+        if letter not in flag_letters:
+            raise ValueError("unknown regex flag: %s" % letter)
+
+        result |= flag_letters[letter]
+
+    return result
+
+
+cache = RegexCache(256)
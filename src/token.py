@@ -64,6 +64,7 @@ INIT    = "init"
 MATCH   = "match"
 TRY     = "try"
 CATCH   = "catch"
+YIELD   = "yield"
 
 class Token(object):
     """a single lexical token"""
@@ -103,6 +104,7 @@ keywords = {
     "init":    INIT,
     "match":   MATCH,
     "try":     TRY,
-    "catch":   CATCH
+    "catch":   CATCH,
+    "yield":   YIELD
 }
 
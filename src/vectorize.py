@@ -0,0 +1,319 @@
+import sys
+import weakref
+import itertools
+
+import obj
+import ast
+from evaluator import TRUE, FALSE, divide
+
+# If set (by --explain-vectorize), each block passed to
+# map, filter or left fold is reported to stderr, saying
+# whether or not it was vectorized.
+explain = False
+
+NUM  = "num"
+BOOL = "bool"
+
+arithmetic = ["+", "-", "*", "/", "**", "//", "%", "&", "|"]
+comparisons = ["<", ">", "<=", ">="]
+
+# Operators which don't behave the same in python as in
+# Pluto's eval_number_infix are implemented as helpers.
+helpers = {
+    "/": "_div",
+    "&": "_b_and",
+    "|": "_b_or"
+}
+
+def _b_and(l, r):
+    return int(l) & int(r)
+
+def _b_or(l, r):
+    return int(l) | int(r)
+
+
+class NotVectorizable(Exception):
+    """raised when a block can't be compiled, with the reason why"""
+    pass
+
+
+class Compiler(object):
+    """compiles the body of a block into a python expression"""
+    def __init__(self, params):
+        self.names = {}
+        self.free = []
+
+        for i, param in enumerate(params):
+            self.names[param] = "p%s" % i
+
+    def compile_body(self, body):
+        if type(body) != ast.BlockStatement or len(body.statements) != 1:
+            raise NotVectorizable("the block must consist of a single expression")
+
+        stmt = body.statements[0]
+
+        if type(stmt) == ast.ExpressionStatement:
+            return self.compile(stmt.expr)
+
+        if type(stmt) == ast.ReturnStatement and stmt.value != None:
+            return self.compile(stmt.value)
+
+        raise NotVectorizable("the block must consist of a single expression")
+
+    def compile(self, node):
+        """returns (source, type) for node"""
+        t = type(node)
+
+        if t == ast.Number:
+            return repr(node.value), NUM
+
+        if t == ast.Boolean:
+            return repr(node.value), BOOL
+
+        if t == ast.Identifier:
+            if node.value not in self.names:
+                self.names[node.value] = "f%s" % len(self.free)
+                self.free.append(node.value)
+
+            return self.names[node.value], NUM
+
+        if t == ast.PrefixExpression:
+            right, r_type = self.compile(node.right)
+
+            if node.operator == "!":
+                return "(not %s)" % truthy(right, r_type), BOOL
+
+            if r_type != NUM:
+                raise NotVectorizable("%s can only be applied to numbers" % node.operator)
+
+            return "(%s%s)" % (node.operator, right), NUM
+
+        if t == ast.InfixExpression:
+            return self.compile_infix(node)
+
+        raise NotVectorizable("%s expressions aren't supported" % type(node).__name__)
+
+    def compile_infix(self, node):
+        op = node.operator
+        left, l_type = self.compile(node.left)
+        right, r_type = self.compile(node.right)
+
+        if op in ["&&", "||"]:
+            # & and | on bools don't short-circuit, so both sides
+            # are evaluated, as they are by the evaluator
+            py_op = "&" if op == "&&" else "|"
+            return "(%s %s %s)" % (truthy(left, l_type), py_op, truthy(right, r_type)), BOOL
+
+        if op in ["==", "!="]:
+            if l_type != r_type:
+                raise NotVectorizable("cannot compare a number with a boolean")
+
+            return "(%s %s %s)" % (left, op, right), BOOL
+
+        if l_type != NUM or r_type != NUM:
+            raise NotVectorizable("%s can only be applied to numbers" % op)
+
+        if op in helpers:
+            return "%s(%s, %s)" % (helpers[op], left, right), NUM
+
+        if op in arithmetic:
+            return "(%s %s %s)" % (left, op, right), NUM
+
+        if op in comparisons:
+            return "(%s %s %s)" % (left, op, right), BOOL
+
+        raise NotVectorizable("the %s operator isn't supported" % op)
+
+
+def truthy(source, t):
+    return source if t == BOOL else "(%s != 0)" % source
+
+
+class Kernel(object):
+    """a compiled block, along with the free variables it needs"""
+    def __init__(self, fn, free, result_type):
+        self.fn = fn
+        self.free = free
+        self.result_type = result_type
+
+
+kernels = weakref.WeakKeyDictionary()
+explained = set()
+
+def compile_kernel(block, kind):
+    """compiles block for the given kind of builtin, returning a Kernel or raising NotVectorizable"""
+    cached = kernels.setdefault(block.body, {})
+
+    if kind not in cached:
+        try:
+            cached[kind] = make_kernel(block, kind)
+        except NotVectorizable as e:
+            cached[kind] = e
+
+    if isinstance(cached[kind], NotVectorizable):
+        raise cached[kind]
+
+    return cached[kind]
+
+def make_kernel(block, kind):
+    params = [param.value for param in block.params]
+    arity = 2 if kind == "fold" else 1
+
+    if len(params) != arity:
+        raise NotVectorizable("the block must have %s parameter%s" % (arity, "" if arity == 1 else "s"))
+
+    compiler = Compiler(params)
+    expr, result_type = compiler.compile_body(block.body)
+    free = "".join(", " + compiler.names[name] for name in compiler.free)
+
+    if kind == "map":
+        source = "def kernel(data%s):\n    return [%s for p0 in data]" % (free, expr)
+    elif kind == "filter":
+        source = "def kernel(data%s):\n    return [%s for p0 in data]" % (free, truthy(expr, result_type))
+    else:
+        if result_type != NUM:
+            raise NotVectorizable("a fold's block must give a number")
+
+        source = "def kernel(data, p0%s):\n    for p1 in data:\n        p0 = %s\n    return p0" % (free, expr)
+
+    scope = {"_div": divide, "_b_and": _b_and, "_b_or": _b_or}
+    exec(source, scope)
+
+    return Kernel(scope["kernel"], compiler.free, result_type)
+
+def report(block, kind, reason):
+    key = (block.body, kind)
+
+    if not explain or key in explained:
+        return
+
+    explained.add(key)
+
+    line, col = block.body.token.start
+    if reason == None:
+        print("%s:%s: %s block vectorized" % (line, col, kind), file=sys.stderr)
+    else:
+        print("%s:%s: %s block not vectorized: %s" % (line, col, kind, reason), file=sys.stderr)
+
+def unboxed(collection):
+    """returns the raw numbers in collection, or None if it can't be vectorized"""
+    if type(collection) == obj.NumArray:
+        return collection.data
+
+    if type(collection) == obj.Range:
+        return collection.range
+
+    if not isinstance(collection, obj.Sequence):
+        return None
+
+    values = []
+
+    for item in collection.iter():
+        if type(item) != obj.Number:
+            return None
+
+        values.append(item.value)
+
+    return values
+
+def prepare(block, collection, context, kind):
+    """returns (kernel, data, free values), or None if the call can't be vectorized"""
+    try:
+        kernel = compile_kernel(block, kind)
+    except NotVectorizable as e:
+        report(block, kind, str(e))
+        return None
+
+    data = unboxed(collection)
+    if data == None:
+        report(block, kind, "the collection must be an array, tuple, range or numeric array of numbers")
+        return None
+
+    free = []
+
+    for name in kernel.free:
+        val = context[name]
+
+        if type(val) != obj.Number:
+            report(block, kind, "`%s` must be a number" % name)
+            return None
+
+        free.append(val.value)
+
+    report(block, kind, None)
+
+    return kernel, data, free
+
+def box(value):
+    if type(value) == bool:
+        return TRUE if value else FALSE
+
+    if type(value) not in [int, float]:
+        raise TypeError("cannot box a %s" % type(value))
+
+    return obj.number(value)
+
+def try_map(block, collection, context):
+    """runs `map $block over $collection` as a kernel, returning None if it can't be"""
+    prepared = prepare(block, collection, context, "map")
+    if prepared == None:
+        return None
+
+    kernel, data, free = prepared
+
+    try:
+        results = kernel.fn(data, *free)
+
+        if type(collection) == obj.NumArray and kernel.result_type == NUM:
+            return obj.numeric(results)
+
+        return collection.rebuild([box(v) for v in results])
+    except (ArithmeticError, TypeError, ValueError):
+        # let the per-element evaluation deal with it
+        return None
+
+def try_filter(block, collection, context):
+    """runs `filter $collection by $block` as a kernel, returning None if it can't be"""
+    prepared = prepare(block, collection, context, "filter")
+    if prepared == None:
+        return None
+
+    kernel, data, free = prepared
+
+    try:
+        mask = kernel.fn(data, *free)
+    except (ArithmeticError, TypeError, ValueError):
+        return None
+
+    if type(collection) == obj.NumArray:
+        return obj.numeric(list(itertools.compress(data, mask)))
+
+    return collection.rebuild(list(itertools.compress(collection.iter(), mask)))
+
+def try_fold(block, collection, start, context):
+    """
+        runs a left fold as a kernel, returning None if it
+        can't be. start is None if the first element should
+        be used instead
+    """
+    if start != None and type(start) != obj.Number:
+        return None
+
+    prepared = prepare(block, collection, context, "fold")
+    if prepared == None:
+        return None
+
+    kernel, data, free = prepared
+
+    if start == None:
+        if len(data) == 0:
+            return None
+
+        acc, data = data[0], itertools.islice(data, 1, None)
+    else:
+        acc = start.value
+
+    try:
+        return box(kernel.fn(data, acc, *free))
+    except (ArithmeticError, TypeError, ValueError):
+        return None